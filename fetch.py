@@ -0,0 +1,137 @@
+"""
+Downloads result files given as http(s) urls into a local cache.
+
+Downloads run concurrently, every worker thread keeps one keep-alive
+connection per host, gzip content is decompressed while it is streamed to
+disk, and cached files are revalidated with ETag/Last-Modified so unchanged
+results are not transferred again.
+"""
+import hashlib
+import http.client
+import json
+import os
+import threading
+import urllib.error
+import urllib.parse
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+# directory the downloaded results are cached in
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'plot-scripts')
+
+# number of concurrent downloads
+MAX_WORKERS = 8
+
+# size of the chunks streamed from the server to disk
+CHUNK_SIZE = 1 << 16
+
+# redirects followed per url before giving up
+MAX_REDIRECTS = 5
+
+# seconds a connection attempt or a read may stall before the download fails
+TIMEOUT = 60
+
+_local = threading.local()
+
+
+def is_url(path):
+    return path.startswith('http://') or path.startswith('https://')
+
+
+def fetch_results(paths, workers=MAX_WORKERS):
+    "Returns `paths` with every url replaced by the path of its cached download"
+    urls = list(dict.fromkeys(path for path in paths if is_url(path)))
+    if len(urls) == 0:
+        return list(paths)
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as pool:
+        cached = dict(zip(urls, pool.map(fetch, urls)))
+    return [cached.get(path, path) for path in paths]
+
+
+def fetch(url):
+    "Downloads `url` into the cache, or revalidates an earlier download, and returns its local path"
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    name = os.path.basename(urllib.parse.urlsplit(url).path) or 'index'
+    if name.endswith('.gz'):
+        name = name[:-len('.gz')]
+    key = hashlib.sha1(url.encode()).hexdigest()[:16]
+    path = os.path.join(CACHE_DIR, '{}-{}'.format(key, name))
+    meta_path = path + '.json'
+
+    headers = {'Accept-Encoding': 'gzip'}
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    location = url
+    for _ in range(MAX_REDIRECTS + 1):
+        response = _request(location, headers)
+        if response.status in (301, 302, 303, 307, 308):
+            response.read()
+            location = urllib.parse.urljoin(location, response.getheader('Location'))
+            continue
+        break
+
+    if response.status == 304:
+        response.read()
+        print("+ Using cached '%s'" % url)
+        return path
+    if response.status != 200:
+        response.read()
+        raise urllib.error.HTTPError(url, response.status, response.reason,
+                                     response.headers, None)
+
+    print("+ Downloading '%s'" % url)
+    gzipped = response.getheader('Content-Encoding') == 'gzip' or \
+        urllib.parse.urlsplit(location).path.endswith('.gz')
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+    with open(tmp_path, 'wb') as f:
+        while True:
+            chunk = response.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(decompressor.decompress(chunk) if gzipped else chunk)
+        if gzipped:
+            f.write(decompressor.flush())
+    os.replace(tmp_path, path)
+
+    with open(meta_path, 'w') as f:
+        json.dump({'url': url,
+                   'etag': response.getheader('ETag'),
+                   'last_modified': response.getheader('Last-Modified')}, f)
+    return path
+
+
+def _request(url, headers):
+    "Sends a GET over this thread's keep-alive connection to the host, reconnecting once if it was closed"
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path or '/'
+    if parts.query:
+        target += '?' + parts.query
+
+    for attempt in range(2):
+        conn = _connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+        try:
+            conn.request('GET', target, headers=headers)
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if attempt > 0:
+                raise
+
+
+def _connection(scheme, netloc, fresh=False):
+    "Returns this thread's connection to `netloc`"
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+    key = (scheme, netloc)
+    if fresh or key not in _local.connections:
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        _local.connections[key] = cls(netloc, timeout=TIMEOUT)
+    return _local.connections[key]
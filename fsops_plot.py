@@ -19,6 +19,15 @@ import warnings
 
 from io import BytesIO
 
+from fetch import fetch, fetch_results, is_url
+from interactive import save_html, throughput_chart
+from machines import join_machines, render_parallel
+from query import scan
+from runner import ThroughputAggregator, run
+from scalability_model import fit_scalability, scalability_curves
+from speedup import compute_speedup
+from throughput import trim_samples
+
 # this is the width of a column in the latex template
 LATEX_TEMPLATE_COLUMNWIDTH = 84.70798
 
@@ -37,6 +46,40 @@ PLOT_ASPECT_RATIO = 16/6
 # this is the plot height
 PLOT_HEIGHT = PLOT_WIDTH/PLOT_ASPECT_RATIO
 
+# layers with more elements than this are rasterised in the pdf output
+RASTER_THRESHOLD = 5000
+
+# this is the resolution of rasterised layers in the pdf output
+RASTER_DPI = 300
+
+# number of per-second measurements dropped at the start of every thread's log
+WARMUP_SECONDS = 0
+
+# number of per-second measurements dropped at the end of every thread's log
+COOLDOWN_SECONDS = 0
+
+# a thread's log in the fsops results
+TRIM_KEYS = ['benchmark', 'write_ratio', 'open_files', 'ncores', 'thread_id']
+
+# the speedup plots are relative to this file system
+SPEEDUP_BASELINE = 'Linux Tmpfs'
+
+# core count the fitted scalability models are extrapolated to
+FIT_MAX_CORES = 512
+
+# a series the scalability models are fitted to
+FIT_KEYS = ['machine', 'bench', 'write_ratio', 'open_files']
+
+# write ratios that are plotted
+WRITE_RATIOS = [0, 10, 60, 100]
+
+# columns of the fsops results that are read for the plots
+RESULT_COLUMNS = ['machine', 'benchmark', 'write_ratio', 'open_files', 'ncores', 'thread_id',
+                  'duration', 'operations']
+
+# prefix of an input argument that runs the benchmark instead of reading a csv
+RUN_PREFIX = 'run:'
+
 # What machine, max cores, sockets, revision
 MACHINES = [
     {
@@ -72,33 +115,120 @@ class theme_my538(theme_gray):
                 strip_background=element_rect(size=0)),
             inplace=True)
 
-def throughput_vs_cores(machine, df_linux, df_bespin, write_ratios=[0, 10, 60, 100]):
+def speedup_vs_cores(machine, open_files, benchmarks):
+    "Plots the throughput of NrFS relative to `SPEEDUP_BASELINE` and writes the ratio table"
+    # every point is a single measurement, there is no spread to draw error bars from
+    ratios = compute_speedup(benchmarks, 'bench', SPEEDUP_BASELINE, ['ncores', 'write_ratio', 'open_files']).drop(columns=['speedup_std'])
+    if len(ratios) == 0:
+        return
+    ratios.to_csv("{}-{}-files-speedup-vs-cores.csv".format(machine['name'], open_files), index=False)
+
+    xskip = int(machine['cores']/8)
+    p = ggplot(data=ratios,
+                mapping=aes(x='ncores',
+                            y='speedup',
+                            color='bench',
+                            shape='bench')) + \
+        theme_my538() + \
+        labs(y="Speedup vs. {}".format(SPEEDUP_BASELINE)) + \
+        theme(legend_position='top', legend_title=element_blank()) + \
+        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Threads') + \
+        scale_color_manual(["#FC8D62", "#8DA0CB", "#A6D854", "#FFD92F", "#E5C494", "#B3B3B3"]) + \
+        geom_hline(yintercept=1, color='#3C3C3C', linetype='dashed', size=0.3) + \
+        geom_point() + \
+        geom_line() + \
+        facet_grid(["write_ratio", "open_files"], scales="free_y") + \
+        guides(color=guide_legend(nrow=1))
+
+    p.save("{}-{}-files-speedup-vs-cores.png".format(machine['name'], open_files),
+            dpi=300, width=0.5*PLOT_WIDTH, height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-files-speedup-vs-cores.pdf".format(machine['name'], open_files),
+            dpi=RASTER_DPI, width=0.5*PLOT_WIDTH, height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+def files_plot(benchmarks, xmax, fits=None):
+    "Builds the throughput vs. threads plot of `benchmarks`, with the curves of the scalability models in `fits`"
+    xskip = int(FIT_MAX_CORES/4) if fits is not None else int(xmax/8)
+    raster = len(benchmarks) > RASTER_THRESHOLD
+    p = ggplot(data=benchmarks,
+                mapping=aes(x='ncores',
+                            y='tps',
+                            color='bench',
+                            shape='bench')) + \
+        theme_my538() + \
+        coord_cartesian(ylim=(0, None), expand=False) + \
+        labs(y="Throughput [Melems/s]") + \
+        theme(legend_position='top', legend_title=element_blank()) + \
+        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Threads') + \
+        scale_y_continuous(labels=lambda lst: ["{:,}".format(x / 1_000_000) for x in lst]) + \
+        scale_color_brewer(type='qual', palette='Set2') + \
+        geom_point(raster=raster) + \
+        geom_line(raster=raster) + \
+        guides(color=guide_legend(nrow=1))
+
+    if fits is not None:
+        curves = scalability_curves(fits, FIT_KEYS, range(1, FIT_MAX_CORES + 1))
+        curves['fit'] = curves['bench'] + curves['model']
+        p = p + geom_line(data=curves, mapping=aes(linetype='model', group='fit'), size=0.3)
+    return p
+
+def plot_files(machine, open_files, benchmarks, interactive=False, fit=False, speedup=False,
+               throughput=True):
+    "Writes the plots of one machine's aggregated results for `open_files` files"
+    if speedup:
+        speedup_vs_cores(machine, open_files, benchmarks)
+    if interactive:
+        save_html(throughput_chart(benchmarks, 'ncores', 'tps', 'bench', "Throughput [elems/s]",
+                                   x_title='# Threads', row='write_ratio', column='open_files'),
+                  "{}-{}-files-throughput-vs-cores.html".format(machine['name'], open_files))
+    fits = None
+    if fit:
+        fits = fit_scalability(benchmarks, FIT_KEYS)
+        print(fits)
+        fits.to_csv("{}-{}-files-scalability-fit.csv".format(machine['name'], open_files), index=False)
+    if not throughput:
+        return
+
+    p = files_plot(benchmarks, machine['cores'], fits) + \
+        facet_grid(["write_ratio", "open_files"], scales="free_y")
+
+    p.save("{}-{}-files-throughput-vs-cores.png".format(machine['name'], open_files),
+            dpi=300, width=0.5*PLOT_WIDTH, height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-files-throughput-vs-cores.pdf".format(machine['name'], open_files),
+            dpi=RASTER_DPI, width=0.5*PLOT_WIDTH, height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+def throughput_vs_cores(machine, df_linux, df_bespin, write_ratios=WRITE_RATIOS, interactive=False, fit=False, speedup=False,
+                        facet=False):
+    # `machine` is one entry of `MACHINES` or a list of them, every machine gets
+    # its own plots or with `facet` all machines are plotted side by side
+    machines = machine if isinstance(machine, list) else [machine]
     data_set = []
     if df_linux is not None and df_bespin is not None:
-        df_linux['benchmark'] = df_linux.apply(lambda row: "{}".format(
-            row.benchmark.split(",")[0]), axis=1)
-        df_bespin['benchmark'] = df_bespin.apply(lambda row: "{}".format(
-            row.benchmark.split(",")[0]), axis=1)
+        df_linux['benchmark'] = df_linux['benchmark'].str.split(",").str[0]
+        df_bespin['benchmark'] = df_bespin['benchmark'].str.split(",").str[0]
         df_linux['bench'] = 'Linux Tmpfs'
         df_bespin['bench'] = 'NrOS NrFS'
+        df_linux = join_machines(df_linux, machines)
+        df_bespin = join_machines(df_bespin, machines)
+        df_linux = trim_samples(df_linux, ['machine'] + TRIM_KEYS, head=WARMUP_SECONDS, tail=COOLDOWN_SECONDS)
+        df_bespin = trim_samples(df_bespin, ['machine'] + TRIM_KEYS, head=WARMUP_SECONDS, tail=COOLDOWN_SECONDS)
 
         for open_files in df_bespin.open_files.unique():
             data_set = []
             for writeratio in df_linux.write_ratio.unique():
-                benchmark = df_linux.loc[(df_linux['benchmark'] == "mix") & (df_linux['ncores'] <= machine['cores'])
+                benchmark = df_linux.loc[(df_linux['benchmark'] == "mix")
                                         & (df_linux['write_ratio'] == writeratio) & (df_linux['open_files'] == open_files)]
 
                 if len(benchmark) == 0 or writeratio not in write_ratios:
                     continue
 
-                benchmark = benchmark.groupby(['write_ratio', 'ncores', 'bench', 'open_files'], as_index=False).agg(
+                benchmark = benchmark.groupby(['machine', 'write_ratio', 'ncores', 'bench', 'open_files'], as_index=False).agg(
                     {'operations': 'sum', 'duration': 'max'})
                 benchmark['tps'] = benchmark['operations'] / benchmark['duration']
                 data_set.append(benchmark)
 
-                benchmark_bespin = df_bespin.loc[(df_bespin['benchmark'] == "mix") & (df_bespin['ncores'] <= machine['cores'])
+                benchmark_bespin = df_bespin.loc[(df_bespin['benchmark'] == "mix")
                     & (df_bespin['write_ratio'] == writeratio) & (df_bespin['open_files'] == open_files)]
-                benchmark_bespin = benchmark_bespin.groupby(['write_ratio', 'ncores', 'bench', 'open_files'], as_index=False).agg(
+                benchmark_bespin = benchmark_bespin.groupby(['machine', 'write_ratio', 'ncores', 'bench', 'open_files'], as_index=False).agg(
                     {'operations': 'sum', 'duration': 'max'})
 
                 benchmark_bespin['tps'] = benchmark_bespin['operations'] / benchmark_bespin['duration']
@@ -109,33 +239,66 @@ def throughput_vs_cores(machine, df_linux, df_bespin, write_ratios=[0, 10, 60, 1
             benchmarks = pd.concat(data_set)
             #print(benchmarks)
 
-            xskip = int(machine['cores']/8)
-            p = ggplot(data=benchmarks,
-                        mapping=aes(x='ncores',
-                                    y='tps',
-                                    color='bench',
-                                    shape='bench')) + \
-                theme_my538() + \
-                coord_cartesian(ylim=(0, None), expand=False) + \
-                labs(y="Throughput [Melems/s]") + \
-                theme(legend_position='top', legend_title=element_blank()) + \
-                scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Threads') + \
-                scale_y_continuous(labels=lambda lst: ["{:,}".format(x / 1_000_000) for x in lst]) + \
-                scale_color_brewer(type='qual', palette='Set2') + \
-                geom_point() + \
-                geom_line() + \
-                facet_grid(["write_ratio", "open_files"], scales="free_y") + \
-                guides(color=guide_legend(nrow=1))
-
-            p.save("{}-{}-files-throughput-vs-cores.png".format(machine['name'], open_files),
-                    dpi=300, width=0.5*PLOT_WIDTH, height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
-            p.save("{}-{}-files-throughput-vs-cores.pdf".format(machine['name'], open_files),
-                    dpi=300, width=0.5*PLOT_WIDTH, height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+            jobs = []
+            for m in machines:
+                data = benchmarks[benchmarks['machine'] == m['name']]
+                if len(data) > 0:
+                    jobs.append((m, open_files, data, interactive, fit, speedup, not facet))
+            render_parallel(plot_files, jobs)
+
+            if facet:
+                fits = fit_scalability(benchmarks, FIT_KEYS) if fit else None
+                p = files_plot(benchmarks, max(m['cores'] for m in machines), fits) + \
+                    facet_grid(["write_ratio", "machine"], scales="free")
+
+                p.save("fsops-{}-files-throughput-vs-cores.png".format(open_files),
+                        dpi=300, width=0.5*PLOT_WIDTH*len(jobs), height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+                p.save("fsops-{}-files-throughput-vs-cores.pdf".format(open_files),
+                        dpi=RASTER_DPI, width=0.5*PLOT_WIDTH*len(jobs), height=2.4*PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+def select_results(frame, machines=MACHINES):
+    "Pushes the benchmark, write ratios, core counts and columns that are plotted into the reader of a results file"
+    return frame.filter('benchmark', 'startswith', "mix") \
+        .filter('write_ratio', 'isin', WRITE_RATIOS) \
+        .filter('ncores', '<=', max(m['cores'] for m in machines)) \
+        .select(RESULT_COLUMNS)
+
+def parse_results(path, archive):
+    "Reads a results csv or archive, or runs the benchmark for a `run:<command>` path and aggregates its output as it arrives"
+    if path.startswith(RUN_PREFIX):
+        aggregator = ThroughputAggregator(TRIM_KEYS, head=WARMUP_SECONDS, tail=COOLDOWN_SECONDS)
+        return run(path[len(RUN_PREFIX):], aggregator, archive)
+    if is_url(path):
+        path = fetch(path)
+    return select_results(scan(path)).collect()
 
 if __name__ == '__main__':
+    # --speedup also plots the throughput relative to Linux
+    speedup = '--speedup' in sys.argv
+    if speedup:
+        sys.argv.remove('--speedup')
+
+    # --fit also fits and plots USL/Amdahl scalability models
+    fit = '--fit' in sys.argv
+    if fit:
+        sys.argv.remove('--fit')
+
+    # --facet plots all machines side by side instead of one plot per machine
+    facet = '--facet' in sys.argv
+    if facet:
+        sys.argv.remove('--facet')
+
+    # --interactive also writes the plots as html
+    interactive = '--interactive' in sys.argv
+    if interactive:
+        sys.argv.remove('--interactive')
+
+    # results given as http(s) urls are downloaded (concurrently) into a local cache
+    sys.argv[1:] = fetch_results(sys.argv[1:])
+
     if len(sys.argv) != 3:
         print(
-            "Usage: <linux fsops csv> <bespin fsops csv>.")
+            "Usage: <linux fsops csv|run:cmd> <bespin fsops csv|run:cmd> [--fit] [--speedup] [--interactive] [--facet].")
         exit(0)
 
     warnings.filterwarnings('ignore')
@@ -144,6 +307,8 @@ if __name__ == '__main__':
     pd.set_option('display.width', 1000)
     pd.set_option('display.expand_frame_repr', True)
 
-    df_linux = pd.read_csv(sys.argv[1])
-    df_bespin = pd.read_csv(sys.argv[2])
-    throughput_vs_cores(MACHINES[0], df_linux, df_bespin)
+    df_linux = parse_results(sys.argv[1], "{}-linux-fsops.npz".format(MACHINES[0]['name']))
+    df_bespin = parse_results(sys.argv[2], "{}-bespin-fsops.npz".format(MACHINES[0]['name']))
+    # results are split by their `machine` column, untagged ones are from MACHINES[0]
+    throughput_vs_cores(MACHINES, df_linux, df_bespin, interactive=interactive, fit=fit, speedup=speedup,
+                        facet=facet)
@@ -11,6 +11,8 @@ import pandas as pd
 from plotnine import *
 from plotnine.data import *
 
+from fetch import fetch_results
+
 # this is the width of a column in the latex template
 LATEX_TEMPLATE_COLUMNWIDTH = 84.70798
 
@@ -29,6 +31,12 @@ PLOT_ASPECT_RATIO = 16/6
 # this is the plot height
 PLOT_HEIGHT = PLOT_WIDTH/PLOT_ASPECT_RATIO
 
+# layers with more elements than this are rasterised in the pdf output
+RASTER_THRESHOLD = 5000
+
+# this is the resolution of rasterised layers in the pdf output
+RASTER_DPI = 300
+
 
 class theme_my538(theme_gray):
     def __init__(self, base_size=6, base_family='DejaVu Sans'):
@@ -59,6 +67,7 @@ class theme_my538(theme_gray):
 
 
 def heatmap(df):
+    raster = len(df) > RASTER_THRESHOLD
     p = ggplot(data=df,
                mapping=aes(x='inter',
                            y='intra',
@@ -67,14 +76,17 @@ def heatmap(df):
         labs(y="#Interop Threads") + \
         labs(x="#Intraop Threads") + \
         theme(legend_position="right", legend_title=element_blank()) + \
-        geom_tile() + \
+        geom_tile(raster=raster) + \
         geom_text(aes(label='tput')) + \
         facet_grid('~batch')
 
     p.save('heatmap.png')
+    p.save('heatmap.pdf', dpi=RASTER_DPI)
 
 
 if __name__ == '__main__':
+    # results given as http(s) urls are downloaded into a local cache
+    sys.argv[1:] = fetch_results(sys.argv[1:])
     df = pd.read_csv(sys.argv[1])
     heatmap(df)
     sys.exit(0)
@@ -0,0 +1,101 @@
+"""
+Interactive (html) versions of the throughput and latency plots.
+
+The frames are aggregated here before they are handed to altair so the html
+only embeds the handful of rows a figure actually draws.
+"""
+import altair as alt
+import numpy as np
+
+# upper bound on the number of rows embedded into one html figure
+MAX_ROWS = 5000
+
+
+def aggregate(df, x, y, series, std=None, max_rows=MAX_ROWS):
+    """Reduces `df` to the rows an interactive throughput figure needs.
+
+    Repeated measurements of the same (`series`, `x`) point are collapsed to
+    their mean and min/max (or mean -/+ `std` if given) in `y_min`/`y_max`.
+    Series that still have more points than their share of `max_rows` are
+    downsampled by averaging runs of consecutive points. Only the columns the
+    figure uses are kept.
+    """
+    lower = df[y] if std is None else df[y] - df[std].fillna(0)
+    upper = df[y] if std is None else df[y] + df[std].fillna(0)
+    points = df[series + [x, y]].assign(y_min=lower, y_max=upper) \
+        .groupby(series + [x], as_index=False) \
+        .agg({y: 'mean', 'y_min': 'min', 'y_max': 'max'})
+
+    groups = points.groupby(series, sort=False)
+    codes = groups.ngroup().to_numpy()
+    sizes = np.bincount(codes)
+    budget = max(1, max_rows // len(sizes))
+    if sizes.max() <= budget:
+        return points
+
+    # `points` is sorted by `x` within every series, so consecutive ranks
+    # fall into the same bucket
+    bucket = groups.cumcount().to_numpy() * budget // sizes[codes]
+    return points.assign(_bucket=bucket) \
+        .groupby(series + ['_bucket'], as_index=False) \
+        .agg({x: 'mean', y: 'mean', 'y_min': 'min', 'y_max': 'max'}) \
+        .drop(columns='_bucket')
+
+
+def throughput_chart(df, x, y, color, y_title, x_title='# Cores', row=None,
+                     column=None, std=None, log_y=False):
+    "Builds an interactive line chart of `y` over `x`, one line per `color`"
+    facets = [f for f in (row, column) if f is not None]
+    data = aggregate(df, x, y, [color] + facets, std=std)
+
+    y_scale = alt.Scale(type='log') if log_y else alt.Scale(zero=True)
+    base = alt.Chart(data).encode(
+        x=alt.X(x, type='quantitative', title=x_title),
+        color=alt.Color(color, type='nominal', title=None,
+                        legend=alt.Legend(orient='top')))
+    spread = base.mark_rule().encode(
+        y=alt.Y('y_min', type='quantitative', scale=y_scale),
+        y2='y_max')
+    lines = base.mark_line(point=True).encode(
+        y=alt.Y(y, type='quantitative', title=y_title, scale=y_scale,
+                axis=alt.Axis(format='~s')),
+        tooltip=[alt.Tooltip(c) for c in [color] + facets + [x]] +
+                [alt.Tooltip(y, format=',.0f')]).interactive()
+
+    chart = alt.layer(spread, lines)
+    if len(facets) > 0:
+        chart = chart.facet(
+            row=alt.Row(row, type='nominal') if row is not None else alt.Undefined,
+            column=alt.Column(column, type='nominal') if column is not None else alt.Undefined)
+    return chart
+
+
+def latency_chart(df, color, y_title, percentiles=('p1', 'p25', 'p50', 'p75', 'p99'), column=None):
+    "Builds an interactive box plot of precomputed latency percentiles per core count"
+    lo, q1, median, q3, hi = percentiles
+    facets = [column] if column is not None else []
+    data = df.groupby([color, 'ncores'] + facets, as_index=False)[list(percentiles)].mean()
+
+    base = alt.Chart(data).encode(
+        x=alt.X('ncores', type='ordinal', title='# Cores'),
+        xOffset=alt.XOffset(color, type='nominal'),
+        color=alt.Color(color, type='nominal', title=None,
+                        legend=alt.Legend(orient='top')),
+        tooltip=[alt.Tooltip(c) for c in [color] + facets + ['ncores'] + list(percentiles)])
+    whiskers = base.mark_rule().encode(
+        y=alt.Y(lo, type='quantitative', title=y_title,
+                scale=alt.Scale(type='log'), axis=alt.Axis(format='~s')),
+        y2=hi)
+    boxes = base.mark_bar(opacity=0.4).encode(y=q1, y2=q3)
+    medians = base.mark_tick(color='black').encode(y=median)
+
+    chart = alt.layer(whiskers, boxes, medians).interactive()
+    if column is not None:
+        chart = chart.facet(column=alt.Column(column, type='nominal'))
+    return chart
+
+
+def save_html(chart, path):
+    "Saves `chart` as a self-contained html file, with its data and vega itself inlined (needs vl-convert)"
+    print("+ Saving to '%s'" % path)
+    chart.save(path, inline=True)
@@ -0,0 +1,151 @@
+"""
+Latency distributions (density and ECDF) from raw latency samples.
+
+The samples are counted on a fixed logarithmic grid in a single pass over the
+log, a chunk at a time (see query.py), so only the counts of every
+configuration are kept in memory. The samples are scaled to the plotted unit
+before they are counted, so every os is binned on the same grid. The density
+is a binned kernel density estimate: the counts are smoothed with a gaussian
+kernel in log space by multiplying their FFT with the Fourier transform of
+the kernel, for all configurations at once.
+"""
+import numpy as np
+import pandas as pd
+
+from query import scan
+
+# bins per decade of the logarithmic grid
+BINS_PER_DECADE = 64
+
+# decades covered by the grid (in the plotted unit), samples outside of it are left out
+LOG_MIN = -9
+LOG_MAX = 12
+
+# number of bins of the grid
+NBINS = (LOG_MAX - LOG_MIN) * BINS_PER_DECADE
+
+# the distributions are cut off this many kernel bandwidths beyond the smallest and largest sample
+CUTOFF = 3
+
+
+class LatencyHistogram:
+    """Counts the latency samples of every configuration on the logarithmic grid.
+
+    A configuration is the set of samples sharing `keys`. The samples are
+    multiplied by `scale` (to the plotted unit) before they are counted.
+    Batches can be added in any order; samples that are not positive are
+    ignored and samples outside of the grid are counted in `outside`.
+    """
+
+    def __init__(self, keys, column='latency', scale=1.0):
+        self.keys = keys
+        self.column = column
+        self.scale = scale
+        self.counts = None
+        self.outside = 0
+
+    def update(self, batch):
+        "Adds a batch of samples"
+        x = batch[self.column].to_numpy(dtype=np.float64) * self.scale
+        valid = np.isfinite(x) & (x > 0)
+        bins = np.full(len(x), -1, dtype=np.int64)
+        bins[valid] = np.floor((np.log10(x[valid]) - LOG_MIN) * BINS_PER_DECADE)
+        inside = (bins >= 0) & (bins < NBINS)
+        self.outside += int((valid & ~inside).sum())
+        if not inside.any():
+            return
+        bins = bins[inside]
+        codes, groups = pd.MultiIndex.from_frame(batch.loc[inside, self.keys]).factorize()
+        groups.names = self.keys
+        counts = np.bincount(codes * NBINS + bins, minlength=len(groups) * NBINS)
+
+        part = pd.DataFrame(counts.reshape(len(groups), NBINS), index=groups)
+        if self.counts is not None:
+            part = pd.concat([self.counts, part]).groupby(level=self.keys).sum()
+        self.counts = part
+
+    def result(self):
+        "Returns the counts, one row per configuration (indexed by `keys`) and one column per bin"
+        if self.counts is None:
+            return pd.DataFrame(columns=range(NBINS),
+                                index=pd.MultiIndex.from_tuples([], names=self.keys))
+        return self.counts
+
+
+def read_histogram(source, keys, column='latency', transform=None, scale=1.0):
+    """Counts the samples of a results file (a path or a `query.LazyFrame`),
+    multiplied by `scale`, in one pass, a chunk at a time.
+
+    `transform` is applied to every chunk before it is counted (e.g. to tag
+    and filter the samples).
+    """
+    histogram = LatencyHistogram(keys, column, scale)
+    frame = scan(source) if isinstance(source, str) else source
+    for chunk in frame.batches():
+        if transform is not None:
+            chunk = transform(chunk)
+        histogram.update(chunk)
+    if histogram.outside > 0:
+        print("+ Left out %d samples outside of [1e%d, 1e%d)" % (histogram.outside, LOG_MIN, LOG_MAX))
+    return histogram.result()
+
+
+def bin_centers():
+    "Returns the centers of the bins of the logarithmic grid"
+    return 10 ** (LOG_MIN + (np.arange(NBINS) + 0.5) / BINS_PER_DECADE)
+
+
+def binned_kde(counts, bandwidth=None):
+    """Smooths every row of `counts` with a gaussian kernel in log10 space.
+
+    The bandwidth (in decades) follows Silverman's rule per row unless it is
+    given, and is at least one bin. Returns the density per decade, every row
+    integrating to one, and the bandwidths.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    n = counts.sum(axis=1)
+    step = 1.0 / BINS_PER_DECADE
+    centers = LOG_MIN + (np.arange(NBINS) + 0.5) * step
+
+    if bandwidth is None:
+        mean = counts @ centers / n
+        sd = np.sqrt(np.maximum(counts @ centers ** 2 / n - mean ** 2, 0.0))
+        cdf = np.cumsum(counts, axis=1) / n[:, None]
+        iqr = centers[np.argmax(cdf >= 0.75, axis=1)] - centers[np.argmax(cdf >= 0.25, axis=1)]
+        spread = np.where(iqr > 0, np.minimum(sd, iqr / 1.34), sd)
+        bandwidth = 0.9 * spread * n ** -0.2
+    bandwidth = np.maximum(np.broadcast_to(bandwidth, n.shape), step)
+
+    # zero padded to twice the grid so the kernel does not wrap around
+    size = 2 * NBINS
+    freqs = np.fft.rfftfreq(size, d=step)
+    kernel = np.exp(-0.5 * (2 * np.pi * freqs[None, :] * bandwidth[:, None]) ** 2)
+    smooth = np.fft.irfft(np.fft.rfft(counts, n=size, axis=1) * kernel, n=size, axis=1)[:, :NBINS]
+    return np.maximum(smooth, 0.0) / (n[:, None] * step), bandwidth
+
+
+def latency_distributions(counts):
+    """Returns the distributions of a `LatencyHistogram` result as a long frame.
+
+    Every configuration has one row per bin with the `latency` (the bin
+    center), the `density` per decade, its `width` relative to the mode
+    (for violins) and the `ecdf` up to the end of the bin. Bins further than
+    `CUTOFF` bandwidths from the samples of a configuration are left out.
+    """
+    values = counts.to_numpy(dtype=np.float64)
+    density, bandwidth = binned_kde(values)
+    ecdf = np.cumsum(values, axis=1) / values.sum(axis=1)[:, None]
+
+    sampled = values > 0
+    first = np.argmax(sampled, axis=1)
+    last = NBINS - 1 - np.argmax(sampled[:, ::-1], axis=1)
+    pad = np.ceil(CUTOFF * bandwidth * BINS_PER_DECADE).astype(np.int64)
+    bins = np.arange(NBINS)
+    rows, cols = np.nonzero((bins >= (first - pad)[:, None]) & (bins <= (last + pad)[:, None]))
+
+    frame = counts.index.to_frame(index=False).iloc[rows].reset_index(drop=True)
+    frame['latency'] = bin_centers()[cols]
+    frame['density'] = density[rows, cols]
+    frame['width'] = frame['density'] / density.max(axis=1)[rows]
+    frame['ecdf'] = ecdf[rows, cols]
+    return frame
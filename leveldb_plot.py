@@ -19,6 +19,11 @@ import warnings
 
 from io import BytesIO
 
+from fetch import fetch_results
+from interactive import save_html, throughput_chart
+from scalability_model import fit_scalability, scalability_curves
+from speedup import compute_speedup
+
 # this is the width of a column in the latex template
 LATEX_TEMPLATE_COLUMNWIDTH = 84.70798
 
@@ -37,6 +42,18 @@ PLOT_ASPECT_RATIO = 16/6
 # this is the plot height
 PLOT_HEIGHT = PLOT_WIDTH/PLOT_ASPECT_RATIO
 
+# layers with more elements than this are rasterised in the pdf output
+RASTER_THRESHOLD = 5000
+
+# this is the resolution of rasterised layers in the pdf output
+RASTER_DPI = 300
+
+# the speedup plots are relative to this file system
+SPEEDUP_BASELINE = 'Linux Tmpfs'
+
+# core count the fitted scalability models are extrapolated to
+FIT_MAX_CORES = 512
+
 class theme_my538(theme_gray):
     def __init__(self, base_size=6, base_family='DejaVu Sans'):
         theme_gray.__init__(self, base_size, base_family)
@@ -64,7 +81,35 @@ class theme_my538(theme_gray):
                 strip_background=element_rect(size=0)),
             inplace=True)
 
-def throughput_vs_cores(df_linux, df_bespin):
+def speedup_vs_cores(benchmarks):
+    "Plots the throughput of NrFS relative to `SPEEDUP_BASELINE` and writes the ratio table"
+    # every point is a single measurement, there is no spread to draw error bars from
+    ratios = compute_speedup(benchmarks, 'bench', SPEEDUP_BASELINE, ['cores']).drop(columns=['speedup_std'])
+    if len(ratios) == 0:
+        return
+    ratios.to_csv("leveldb-speedup.csv", index=False)
+
+    xskip = int(32/4)
+    p = ggplot(data=ratios,
+                mapping=aes(x='cores',
+                            y='speedup',
+                            color='bench',
+                            shape='bench')) + \
+        theme_my538() + \
+        coord_cartesian(xlim = (0.5, 32.5), expand=False) + \
+        labs(y="Speedup vs. {}".format(SPEEDUP_BASELINE)) + \
+        theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
+        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Threads') + \
+        scale_color_manual(["#FC8D62", "#8DA0CB", "#A6D854", "#FFD92F", "#E5C494", "#B3B3B3"]) + \
+        geom_hline(yintercept=1, color='#3C3C3C', linetype='dashed', size=0.3) + \
+        geom_point() + \
+        geom_line() + \
+        guides(color=guide_legend(nrow=1))
+
+    p.save("leveldb-speedup.png", dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("leveldb-speedup.pdf", dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+def throughput_vs_cores(df_linux, df_bespin, interactive=False, fit=False, speedup=False):
     # Manual copy to reuse other plot scripts
     df_linux['cores'] = df_linux['ncores']
     df_linux['tps'] = df_linux['operations']
@@ -77,31 +122,65 @@ def throughput_vs_cores(df_linux, df_bespin):
     benchmarks = pd.concat([df_linux, df_bespin])
 
     #print(benchmarks)
-
-    xskip = int(32/4)
+    if speedup:
+        speedup_vs_cores(benchmarks)
+    if interactive:
+        save_html(throughput_chart(benchmarks, 'cores', 'tps', 'bench', "Throughput [elems/s]",
+                                   x_title='# Threads'),
+                  "leveldb.html")
+
+    xmax = FIT_MAX_CORES if fit else 32
+    xskip = int(xmax/4)
+    raster = len(benchmarks) > RASTER_THRESHOLD
     p = ggplot(data=benchmarks,
                 mapping=aes(x='cores',
                             y='tps',
                             color='bench',
                             shape='bench')) + \
         theme_my538() + \
-        coord_cartesian(ylim=(0, 1_300_000), xlim = (0.5, 32.5), expand=False) + \
+        coord_cartesian(ylim=(0, None if fit else 1_300_000), xlim = (0.5, xmax + 0.5), expand=False) + \
         labs(y="Throughput [Kelems/s]") + \
         theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
         scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Threads') + \
         scale_y_continuous(labels=lambda lst: ["{:,}".format(x / 1_000) for x in lst]) + \
         scale_color_brewer(type='qual', palette='Set2') + \
-        geom_point() + \
-        geom_line() + \
+        geom_point(raster=raster) + \
+        geom_line(raster=raster) + \
         guides(color=guide_legend(nrow=1))
 
+    if fit:
+        fits = fit_scalability(benchmarks, ['bench'], x='cores')
+        print(fits)
+        fits.to_csv("leveldb-scalability-fit.csv", index=False)
+        curves = scalability_curves(fits, ['bench'], range(1, FIT_MAX_CORES + 1), x='cores')
+        curves['fit'] = curves['bench'] + curves['model']
+        p = p + geom_line(data=curves, mapping=aes(linetype='model', group='fit'), size=0.3)
+
     p.save("leveldb.png", dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
-    p.save("leveldb.pdf", dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("leveldb.pdf", dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
 
 if __name__ == '__main__':
+    # --speedup also plots the throughput relative to Linux
+    speedup = '--speedup' in sys.argv
+    if speedup:
+        sys.argv.remove('--speedup')
+
+    # --fit also fits and plots USL/Amdahl scalability models
+    fit = '--fit' in sys.argv
+    if fit:
+        sys.argv.remove('--fit')
+
+    # --interactive also writes the plots as html
+    interactive = '--interactive' in sys.argv
+    if interactive:
+        sys.argv.remove('--interactive')
+
+    # results given as http(s) urls are downloaded (concurrently) into a local cache
+    sys.argv[1:] = fetch_results(sys.argv[1:])
+
     if len(sys.argv) != 3:
         print(
-            "Usage: <linux leveldb csv> <bespin leveldb csv>.")
+            "Usage: <linux leveldb csv> <bespin leveldb csv> [--fit] [--speedup] [--interactive].")
         exit(0)
 
     warnings.filterwarnings('ignore')
@@ -112,4 +191,4 @@ if __name__ == '__main__':
 
     df_linux = pd.read_csv(sys.argv[1])
     df_bespin = pd.read_csv(sys.argv[2])
-    throughput_vs_cores(df_linux, df_bespin)
\ No newline at end of file
+    throughput_vs_cores(df_linux, df_bespin, interactive=interactive, fit=fit, speedup=speedup)
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Helpers for results from several machines (the `MACHINES` table of a script).
+
+Results carry the machine they were measured on in a `machine` column;
+results without one belong to the first machine of the table.
+"""
+import os
+
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+def tag_machine(df, machines):
+    "Returns `df` with a `machine` column, set to the first machine's name where missing"
+    if 'machine' not in df.columns:
+        return df.assign(machine=machines[0]['name'])
+    return df.assign(machine=df['machine'].fillna(machines[0]['name']))
+
+
+def join_machines(df, machines, ncores='ncores'):
+    """Tags `df` with its machine and drops the rows that used more cores than
+    their machine has, as one lookup against the machine table.
+
+    Rows of machines that are not in `machines` are dropped as well.
+    """
+    df = tag_machine(df, machines)
+    cores = pd.Series({m['name']: m['cores'] for m in machines})
+    return df[df[ncores] <= df['machine'].map(cores)]
+
+
+def join_machine_cores(df, machines, key, ncores='ncores'):
+    """Tags `df` with its machine and keeps the rows whose core count is listed
+    in their machine's `key` entry (e.g. `cores_latency`)."""
+    df = tag_machine(df, machines)
+    pairs = pd.MultiIndex.from_tuples(
+        [(m['name'], n) for m in machines for n in m.get(key, [])])
+    return df[pd.MultiIndex.from_arrays([df['machine'], df[ncores]]).isin(pairs)]
+
+
+def render_parallel(func, jobs):
+    "Calls `func(*args)` for every job, in worker processes if there is more than one"
+    if len(jobs) <= 1:
+        for args in jobs:
+            func(*args)
+        return
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+        for future in [pool.submit(func, *args) for args in jobs]:
+            future.result()
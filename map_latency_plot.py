@@ -24,6 +24,13 @@ from plotnine.themes.elements import (element_line, element_rect,
 from plotnine.themes.theme import theme
 from plotnine.themes.theme_gray import theme_gray
 
+from fetch import fetch, fetch_results, is_url
+from interactive import latency_chart, save_html
+from latency_density import latency_distributions, read_histogram
+from machines import join_machine_cores, render_parallel
+from query import scan
+from regression import changed_series, detect_changes, rank_suspects, revision_matrices, revision_order
+
 # this is the width of a column in the latex template
 LATEX_TEMPLATE_COLUMNWIDTH = 84.70798
 
@@ -42,6 +49,12 @@ PLOT_WIDTH = LATEX_TEMPLATE_COLUMNWIDTH * 2 / 3
 # this is the plot height
 PLOT_HEIGHT = PLOT_WIDTH/PLOT_ASPECT_RATIO
 
+# layers with more elements than this are rasterised in the pdf output
+RASTER_THRESHOLD = 5000
+
+# this is the resolution of rasterised layers in the pdf output
+RASTER_DPI = 300
+
 class bcolors:
     OK = '\033[32m'
     WARNING = '\033[33m'
@@ -49,6 +62,18 @@ class bcolors:
     BOLD = '\033[1m'
     RESET = '\033[0m'
 
+# a series that is checked for regressions across revisions
+REGRESSION_KEYS = ['machine', 'os', 'benchmark', 'ncores', 'percentile']
+
+# latency percentiles that are checked for regressions
+REGRESSION_PERCENTILES = ['p50', 'p99']
+
+# number of changed series plotted in the regression report
+REGRESSION_PLOT_SERIES = 16
+
+# factor from the unit of the raw latency samples of every os to the plotted unit
+SAMPLE_SCALE = {'Linux': 1, 'NrOS VM': 1 / (1000*1000)}
+
 # What machine, max cores, linux vmops rev
 MACHINES = [
     {
@@ -82,13 +107,17 @@ class theme_my538(theme_gray):
             inplace=True)
 
 
-def plot_latency(filename, machine, benchmark_name, df_linux, df_bespin):
+def plot_latency(filename, machine, benchmark_name, df_linux, df_bespin, interactive=False, facet=False,
+                 regressions=False, repo=None):
     "Plots a throughput graph for various threads showing the throughput over time"
     # csv format is:
     # git_rev,thread_id,benchmark,ncores,memsize,samples_total,sample_id,latency
+    # `machine` is one entry of `MACHINES` or a list of them, every machine gets
+    # its own plot or with `facet` all machines are plotted side by side
+    machines = machine if isinstance(machine, list) else [machine]
     dataframes = []
     print("\n" + bcolors.BOLD + ("+ Plotting '%s' on '%s'" %
-                                 (benchmark_name, machine['name'])) + bcolors.RESET)
+                                 (benchmark_name, ', '.join(m['name'] for m in machines))) + bcolors.RESET)
 
     if df_bespin is not None:
         df_bespin['os'] = "Bespin"
@@ -116,9 +145,32 @@ def plot_latency(filename, machine, benchmark_name, df_linux, df_bespin):
 
     benchmark = pd.concat(dataframes)
     # print(benchmark)
-    benchmark = benchmark[benchmark['ncores'].isin(machine['cores_latency'])]
+    benchmark = join_machine_cores(benchmark, machines, 'cores_latency')
     benchmark['ncores'] = benchmark['ncores'].astype('int64', copy=False)
 
+    if regressions:
+        regression_report(filename, benchmark_name, benchmark, repo)
+    elif facet:
+        save_latency(filename, benchmark_name, benchmark, interactive, facet=True)
+    else:
+        jobs = []
+        for m in machines:
+            data = benchmark[benchmark['machine'] == m['name']]
+            if len(data) > 0:
+                # a single machine keeps the given file name, several are told apart by theirs
+                name = filename if isinstance(machine, dict) else "{}-{}".format(m['name'], filename)
+                jobs.append((name, benchmark_name, data, interactive))
+        render_parallel(save_latency, jobs)
+
+
+def save_latency(filename, benchmark_name, benchmark, interactive=False, facet=False):
+    "Saves the latency box plot of `benchmark`, with one panel per machine if `facet` is set"
+    if interactive:
+        save_html(latency_chart(benchmark, 'os', "Latency [ms]", column='machine' if facet else None),
+                  "{}-{}-latency.html".format(filename, benchmark_name))
+
+    raster = len(benchmark) > RASTER_THRESHOLD
+
     p = ggplot(data=benchmark, mapping=aes(x='factor(ncores)',
                                            ymax='p99',
                                            upper='p75',
@@ -134,9 +186,14 @@ def plot_latency(filename, machine, benchmark_name, df_linux, df_bespin):
         scale_x_discrete(name='# Cores') + \
         scale_y_log10(labels=lambda lst: ["{:,.2f}".format(x) for x in lst]) + \
         scale_color_brewer(type='qual', palette='Set2') + \
-        geom_boxplot(stat='identity', notchwidth=0.53, alpha=0.2) + \
+        geom_boxplot(stat='identity', notchwidth=0.53, alpha=0.2, raster=raster) + \
         guides(color=guide_legend(nrow=1))
 
+    width = PLOT_WIDTH
+    if facet:
+        p = p + facet_wrap('~machine', scales='free_x')
+        width = PLOT_WIDTH * benchmark['machine'].nunique()
+
     # geom_violin(mapping=None, data=None, stat='ydensity', position='dodge',
     #        na_rm=False, inherit_aes=True, show_legend=None, width=None,
     #        trim=True, scale='area', draw_quantiles=None, **kwargs)
@@ -145,14 +202,162 @@ def plot_latency(filename, machine, benchmark_name, df_linux, df_bespin):
                                  ("{}-{}-latency.png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
 
     p.save("{}-{}-latency.png".format(filename, benchmark_name),
-           dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+           dpi=300, width=width, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
     p.save("{}-{}-latency.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=width, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+
+def regression_report(filename, benchmark_name, benchmark, repo=None):
+    "Finds the revisions that made a latency percentile worse and plots the affected series"
+    if 'git_rev' not in benchmark.columns:
+        print(bcolors.WARNING + "+ No `git_rev` in the results, cannot check for regressions" + bcolors.RESET)
+        return
+
+    # every os has its own revisions, in the order of its log unless a repository is given
+    orders = {name: revision_order(benchmark.loc[benchmark['os'] == name, 'git_rev'], repo)
+              for name in pd.unique(benchmark['os'])}
+
+    points = benchmark.melt(id_vars=['git_rev', 'machine', 'os', 'benchmark', 'ncores'],
+                            value_vars=REGRESSION_PERCENTILES, var_name='percentile', value_name='latency')
+    matrices = revision_matrices(points, REGRESSION_KEYS, orders, y='latency')
+    if len(matrices) == 0:
+        print(bcolors.WARNING + "+ No revisions to check" + bcolors.RESET)
+        return
+    changes = pd.concat([detect_changes(matrix, higher_is_better=False) for matrix in matrices.values()],
+                        ignore_index=True)
+    suspects = rank_suspects(changes)
+    changes.to_csv("{}-{}-regressions.csv".format(filename, benchmark_name), index=False)
+    suspects.to_csv("{}-{}-regression-suspects.csv".format(filename, benchmark_name), index=False)
+    print(suspects)
+
+    if len(changes) == 0:
+        print(bcolors.OK + ("+ No regressions in %d revisions" %
+                            sum(len(matrix) for matrix in matrices.values())) + bcolors.RESET)
+        return
+
+    data = pd.concat([changed_series(matrix, changes, REGRESSION_KEYS, REGRESSION_PLOT_SERIES, y='latency')
+                      for matrix in matrices.values()], ignore_index=True)
+    nseries = data['series'].nunique()
+    raster = len(data) > RASTER_THRESHOLD
+    p = ggplot(data=data, mapping=aes(x='position', y='latency')) + \
+        theme_my538() + \
+        labs(x="Revision", y="Latency [ms]") + \
+        scale_y_continuous(labels=lambda lst: ["{:,.2f}".format(x) for x in lst]) + \
+        geom_line(color='#66C2A5', raster=raster) + \
+        geom_vline(data=data[data['changed']], mapping=aes(xintercept='position'),
+                   color='#FC8D62', linetype='dashed', size=0.3) + \
+        facet_wrap('~series', scales='free_y', ncol=4)
+
+    height = PLOT_HEIGHT * np.ceil(nseries / 4)
+    print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                 ("{}-{}-regressions.png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
+    p.save("{}-{}-regressions.png".format(filename, benchmark_name),
+           dpi=300, width=2*PLOT_WIDTH, height=height, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-regressions.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=2*PLOT_WIDTH, height=height, units=PLOT_SIZE_UNIT)
+
+
+def plot_distribution(filename, machine, benchmark_name, linux_samples, bespin_samples):
+    "Plots violins and ECDFs of the raw latency samples of every os and core count"
+    # csv format is:
+    # git_rev,thread_id,benchmark,ncores,memsize,samples_total,sample_id,latency
+    machines = machine if isinstance(machine, list) else [machine]
+    print("\n" + bcolors.BOLD + ("+ Plotting '%s' distributions on '%s'" %
+                                 (benchmark_name, ', '.join(m['name'] for m in machines))) + bcolors.RESET)
+
+    def select(df):
+        return join_machine_cores(df, machines, 'cores_latency')
+
+    # the samples are counted while the csv is read, they are never all in memory at once,
+    # and samples of other core counts are dropped before they are counted
+    dataframes = []
+    if bespin_samples is not None:
+        counts = read_histogram(select_samples(scan(bespin_samples), machines), ['machine', 'ncores'],
+                                transform=select, scale=SAMPLE_SCALE['NrOS VM'])
+        dataframes.append(latency_distributions(counts).assign(os='NrOS VM'))
+    if linux_samples is not None:
+        samples = select_samples(scan(linux_samples), machines).filter('benchmark', '==', benchmark_name)
+        counts = read_histogram(samples, ['machine', 'ncores'], transform=select,
+                                scale=SAMPLE_SCALE['Linux'])
+        dataframes.append(latency_distributions(counts).assign(os='Linux'))
+    if len(dataframes) == 0:
+        print("no data to plot")
+        return
+    dist = pd.concat(dataframes, ignore_index=True)
+    dist['ncores'] = dist['ncores'].astype('int64', copy=False)
+
+    # violins as polygons around the position of every core count, dodged by os
+    levels = sorted(dist['ncores'].unique())
+    oses = sorted(dist['os'].unique())
+    slot = 0.9 / len(oses)
+    center = dist['ncores'].map({n: i + 1 for i, n in enumerate(levels)}) + \
+        (dist['os'].map({o: i for i, o in enumerate(oses)}) - (len(oses) - 1) / 2) * slot
+    half = dist['width'] * 0.45 * slot
+    violin = ['machine', 'os', 'ncores']
+    outline = pd.concat([
+        dist.assign(x=center - half, side=0, order=dist['latency']),
+        dist.assign(x=center + half, side=1, order=-dist['latency'])]) \
+        .sort_values(violin + ['side', 'order'], ignore_index=True)
+    outline['violin'] = outline[violin].astype(str).agg('-'.join, axis=1)
+
+    facet = facet_wrap('~machine') if dist['machine'].nunique() > 1 else None
+    raster = len(outline) > RASTER_THRESHOLD
+    p = ggplot(data=outline, mapping=aes(x='x', y='latency', group='violin', color='os', fill='os')) + \
+        theme_my538() + \
+        scale_fill_brewer(type='qual', palette='Set2') + \
+        theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
+        labs(y="Latency [ms]") + \
+        scale_x_continuous(breaks=list(range(1, len(levels) + 1)), labels=[str(n) for n in levels],
+                           name='# Cores') + \
+        scale_y_log10(labels=lambda lst: ["{:,.2f}".format(x) for x in lst]) + \
+        scale_color_brewer(type='qual', palette='Set2') + \
+        geom_polygon(alpha=0.2, size=0.3, raster=raster) + \
+        guides(color=guide_legend(nrow=1))
+    if facet is not None:
+        p = p + facet + theme(legend_position='top')
+
+    print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                 ("{}-{}-violin.png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
+    p.save("{}-{}-violin.png".format(filename, benchmark_name),
            dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-violin.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+    raster = len(dist) > RASTER_THRESHOLD
+    p = ggplot(data=dist, mapping=aes(x='latency', y='ecdf', color='os')) + \
+        theme_my538() + \
+        theme(legend_position='top', legend_title=element_blank()) + \
+        labs(x="Latency [ms]", y="ECDF") + \
+        scale_x_log10(labels=lambda lst: ["{:g}".format(x) for x in lst]) + \
+        scale_color_brewer(type='qual', palette='Set2') + \
+        geom_step(raster=raster) + \
+        guides(color=guide_legend(nrow=1))
+    p = p + (facet_grid('machine ~ ncores') if facet is not None else facet_wrap('~ncores', nrow=1))
+
+    print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                 ("{}-{}-ecdf.png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
+    p.save("{}-{}-ecdf.png".format(filename, benchmark_name),
+           dpi=300, width=2*PLOT_WIDTH, height=PLOT_HEIGHT * dist['machine'].nunique(), units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-ecdf.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=2*PLOT_WIDTH, height=PLOT_HEIGHT * dist['machine'].nunique(), units=PLOT_SIZE_UNIT)
+
+
+def select_results(frame, machines=MACHINES):
+    "Pushes the core counts that are plotted into the reader of a results file"
+    return frame.filter('ncores', 'isin', sorted({n for m in machines for n in m.get('cores_latency', [])}))
 
 
-def parse_results(path):
+def select_samples(frame, machines=MACHINES):
+    "Pushes the core counts that are plotted and the columns of the samples into the reader of a samples file"
+    return select_results(frame, machines).select(['machine', 'ncores', 'latency'])
+
+
+def parse_results(path, query=select_results):
+    "Reads a results csv or archive, with the filters and columns of `query(frame)` pushed into the reader"
+    if is_url(path):
+        path = fetch(path)
     if os.path.exists(path):
-        return pd.read_csv(path)
+        return query(scan(path)).collect()
     else:
         return None
 
@@ -169,11 +374,45 @@ if __name__ == '__main__':
     pd.set_option('display.width', 1000)
     pd.set_option('display.expand_frame_repr', True)
 
+    # --regressions[=<git repo>] only writes a report of the revisions that made the
+    # latency worse, ordered by commit time in <git repo> or else as they appear in the logs
+    regressions = next((arg for arg in sys.argv if arg.startswith('--regressions')), None)
+    repo = None
+    if regressions is not None:
+        sys.argv.remove(regressions)
+        repo = regressions.partition('=')[2] or None
+
+    # --samples reads raw latency samples (a `latency` per row) and plots their violins and ECDFs
+    samples = '--samples' in sys.argv
+    if samples:
+        sys.argv.remove('--samples')
+
+    # --facet plots all machines side by side instead of one plot per machine
+    facet = '--facet' in sys.argv
+    if facet:
+        sys.argv.remove('--facet')
+
+    # --interactive also writes the plots as html
+    interactive = '--interactive' in sys.argv
+    if interactive:
+        sys.argv.remove('--interactive')
+
+    # results given as http(s) urls are downloaded (concurrently) into a local cache
+    sys.argv[1:] = fetch_results(sys.argv[1:])
+
     if len(sys.argv) != 3:
         print(
-            "Usage: <linux map-latency csv> <bespin map-latency csv>.")
+            "Usage: <linux map-latency csv> <bespin map-latency csv> [--interactive] [--facet] [--regressions[=<git repo>]] [--samples].")
+    elif samples:
+        plot_distribution("vmops-latency", MACHINES, "maponly",
+                          sys.argv[1] if os.path.exists(sys.argv[1]) else None,
+                          sys.argv[2] if os.path.exists(sys.argv[2]) else None)
     else:
-        df_linux = parse_results(sys.argv[1])
+        df_linux = parse_results(sys.argv[1],
+                                 lambda frame: select_results(frame).filter('benchmark', '==', "maponly"))
         df_bespin = parse_results(sys.argv[2])
-        machine = MACHINES[0]
-        plot_latency(machine['name'] + "-vmops-latency", machine, "maponly", df_linux, df_bespin)
+        # results are split by their `machine` column, untagged ones are from MACHINES[0]
+        plot_latency("vmops-latency", MACHINES, "maponly", df_linux, df_bespin,
+                     interactive=interactive, facet=facet,
+                     regressions=regressions is not None,
+                     repo=repo)
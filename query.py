@@ -0,0 +1,126 @@
+"""
+Lazy reading of result files with predicate and projection pushdown.
+
+`scan(path)` returns a `LazyFrame` that only records filters and the columns
+a plot needs. `collect()` then reads the file once: csvs are parsed a chunk
+at a time with only the needed columns and every chunk is filtered before it
+is kept, `ColumnArchive`s (see runner.py) read the predicate columns of a
+batch first and only load the other columns of batches with matching rows.
+The full file is never in memory as a frame.
+"""
+import operator
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from runner import STR_COLUMNS, archive_members, read_member
+
+# rows of a csv that are parsed and filtered at once
+CHUNK_ROWS = 1 << 18
+
+# operators a predicate can use, on numpy arrays
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'isin': np.isin,
+    'startswith': lambda values, prefix: np.char.startswith(values.astype(str), prefix),
+}
+
+
+class LazyFrame:
+    """A result file with the filters and columns to read it with.
+
+    `filter` and `select` return new frames, nothing is read until `collect`
+    or `batches` is called.
+    """
+
+    def __init__(self, path, predicates=(), columns=None):
+        self.path = path
+        self.predicates = tuple(predicates)
+        self.columns = columns
+
+    def filter(self, column, op, value):
+        "Keeps only the rows where `column <op> value` holds"
+        if op not in OPERATORS:
+            raise ValueError("unknown operator '%s'" % op)
+        return LazyFrame(self.path, self.predicates + ((column, op, value),), self.columns)
+
+    def select(self, columns):
+        "Reads only `columns`, the ones that are not in the file are left out"
+        return LazyFrame(self.path, self.predicates, list(columns))
+
+    def batches(self):
+        "Yields the matching rows of the file as frames, a chunk or archive batch at a time"
+        if zipfile.is_zipfile(self.path):
+            return self._archive_batches()
+        return self._csv_batches()
+
+    def collect(self):
+        "Reads the matching rows of the file into a frame"
+        frames = list(self.batches())
+        if len(frames) == 0:
+            return self._empty()
+        return pd.concat(frames, ignore_index=True)
+
+    def _empty(self):
+        if zipfile.is_zipfile(self.path):
+            with zipfile.ZipFile(self.path) as archive:
+                header = list(archive_members(archive))
+        else:
+            header = list(pd.read_csv(self.path, nrows=0).columns)
+        columns = header if self.columns is None else [c for c in self.columns if c in header]
+        return pd.DataFrame(columns=columns)
+
+    def _needed(self, column):
+        return self.columns is None or column in self.columns or \
+            any(column == c for c, _, _ in self.predicates)
+
+    def _mask(self, load):
+        mask = None
+        for column, op, value in self.predicates:
+            match = np.asarray(OPERATORS[op](load(column), value), dtype=bool)
+            mask = match if mask is None else mask & match
+            if not mask.any():
+                break
+        return mask
+
+    def _csv_batches(self):
+        # every chunk guesses its own column types, so keys that can look like
+        # numbers (short revision hashes) are always read as strings
+        dtype = {column: str for column in STR_COLUMNS}
+        for chunk in pd.read_csv(self.path, usecols=self._needed, dtype=dtype, chunksize=CHUNK_ROWS):
+            mask = self._mask(lambda column: chunk[column].to_numpy())
+            if mask is not None:
+                chunk = chunk[mask]
+            if len(chunk) > 0:
+                yield chunk if self.columns is None else \
+                    chunk[[c for c in self.columns if c in chunk.columns]]
+
+    def _archive_batches(self):
+        with zipfile.ZipFile(self.path) as archive:
+            members = archive_members(archive)
+            columns = [c for c in (self.columns if self.columns is not None else members)
+                       if c in members]
+            for batch in range(max((len(names) for names in members.values()), default=0)):
+                loaded = {}
+
+                def load(column):
+                    if column not in loaded:
+                        loaded[column] = read_member(archive, members[column][batch])
+                    return loaded[column]
+
+                mask = self._mask(load)
+                if mask is not None and not mask.any():
+                    continue
+                yield pd.DataFrame({c: load(c) if mask is None else load(c)[mask] for c in columns},
+                                   columns=columns)
+
+
+def scan(path):
+    "Returns a `LazyFrame` of a results csv or `ColumnArchive`"
+    return LazyFrame(path)
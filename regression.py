@@ -0,0 +1,158 @@
+"""
+Finds the revisions that made a benchmark worse.
+
+The measurements are arranged as a (revision x series) matrix with the
+revisions in commit order. For every revision the mean of the `WINDOW`
+revisions before it is compared with the mean of the `WINDOW` revisions
+starting at it, for all series at once from cumulative sums of the matrix.
+A revision is a change point of a series if the shift is large (relative to
+the earlier mean) and significant (in standard errors of the two windows),
+and the largest such shift of the series within a window.
+"""
+import numpy as np
+import pandas as pd
+
+from numpy.lib.stride_tricks import sliding_window_view
+from plumbum import local
+
+# number of revisions before and after a revision that are compared
+WINDOW = 5
+
+# relative change of the mean below which a shift is not reported
+THRESHOLD = 0.05
+
+# shift of the mean, in standard errors, below which a shift is not reported
+MIN_SCORE = 3.0
+
+# revisions needed on both sides of a change point
+MIN_REVISIONS = 2
+
+
+def revision_order(revs, repo=None):
+    """Returns the unique `revs` ordered by commit time in the git repository `repo`,
+    or in order of first appearance if no repository is given.
+
+    Revisions that are not commits of `repo` are left out, with a warning.
+    """
+    revs = list(pd.unique(pd.Series(revs).dropna().astype(str)))
+    if repo is None or len(revs) == 0:
+        return revs
+
+    # `git log` fails on unknown revisions, so they are looked up first
+    out = (local['git']['-C', repo, 'cat-file', '--batch-check']
+           << ''.join(rev + '^{commit}\n' for rev in revs))()
+    known = [line.split()[1:2] == ['commit'] for line in out.splitlines()]
+    unknown = [rev for rev, found in zip(revs, known) if not found]
+    if len(unknown) > 0:
+        print("+ Skipping %d revisions that are not in '%s': %s" %
+              (len(unknown), repo, ', '.join(unknown[:10]) + (', ...' if len(unknown) > 10 else '')))
+        revs = [rev for rev, found in zip(revs, known) if found]
+        if len(revs) == 0:
+            return revs
+
+    # a single git call for all revisions, `--no-walk=unsorted` keeps their order
+    out = (local['git']['-C', repo, 'log', '--no-walk=unsorted', '--format=%ct', '--stdin']
+           << '\n'.join(revs) + '\n')()
+    times = np.array(out.split(), dtype=np.int64)
+    return [revs[i] for i in np.argsort(times, kind='stable')]
+
+
+def revision_matrix(df, keys, order, rev='git_rev', y='tps'):
+    """Returns the mean of `y` per revision and series (the rows sharing `keys`),
+    with one row per revision of `order` and NaN where a series was not measured."""
+    data = df.assign(**{rev: df[rev].astype(str)})
+    matrix = data.pivot_table(index=rev, columns=keys, values=y, aggfunc='mean')
+    return matrix.reindex(order).rename_axis(rev)
+
+
+def revision_matrices(points, keys, orders, rev='git_rev', y='tps', axis='os'):
+    """Returns a `revision_matrix` for every value of `axis` in `orders` (e.g. every os),
+    each with its own revision order, as revisions of different systems are not comparable."""
+    return {name: revision_matrix(points[points[axis] == name], keys, order, rev, y)
+            for name, order in orders.items() if len(order) > 0}
+
+
+def detect_changes(matrix, window=WINDOW, threshold=THRESHOLD, min_score=MIN_SCORE,
+                   min_revisions=MIN_REVISIONS, higher_is_better=True, rev='git_rev'):
+    """Finds the change points of every series (column) of a `revision_matrix`
+    that made it worse.
+
+    Returns one row per change point with the series keys, the revision `rev`,
+    its `position` in the revision order, the window means `before` and
+    `after`, the relative `change` and the `score` in standard errors.
+    """
+    values = matrix.to_numpy(dtype=np.float64)
+    nrevs, nseries = values.shape
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+
+    def prefix(a):
+        return np.vstack([np.zeros((1, nseries)), np.cumsum(a, axis=0)])
+
+    sums, squares, counts = prefix(x), prefix(x * x), prefix(valid.astype(np.float64))
+
+    # window [lo, r) before and [r, hi) after every revision r
+    r = np.arange(nrevs)
+    lo = np.clip(r - window, 0, nrevs)
+    hi = np.clip(r + window, 0, nrevs)
+
+    def window_stats(start, end):
+        n = counts[end] - counts[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = (sums[end] - sums[start]) / n
+            var = ((squares[end] - squares[start]) - n * mean * mean) / (n - 1)
+        return n, mean, np.maximum(var, 0.0)
+
+    n_before, before, var_before = window_stats(lo, r)
+    n_after, after, var_after = window_stats(r, hi)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (after - before) / np.abs(before)
+        score = np.abs(after - before) / np.sqrt(
+            np.nan_to_num(var_before / n_before) + np.nan_to_num(var_after / n_after))
+    worse = -change if higher_is_better else change
+
+    candidate = (n_before >= min_revisions) & (n_after >= min_revisions) & valid & \
+        (worse >= threshold) & (score >= min_score)
+    magnitude = np.where(candidate, worse, -np.inf)
+
+    # keep the largest shift of a series within a window on either side
+    padded = np.pad(magnitude, ((window, window), (0, 0)), constant_values=-np.inf)
+    peak = sliding_window_view(padded, 2 * window + 1, axis=0).max(axis=-1)
+    positions, series = np.nonzero(candidate & (magnitude == peak))
+
+    changes = matrix.columns[series].to_frame(index=False)
+    changes[rev] = matrix.index[positions]
+    changes['position'] = positions
+    changes['before'] = before[positions, series]
+    changes['after'] = after[positions, series]
+    changes['change'] = change[positions, series]
+    changes['score'] = score[positions, series]
+    return changes
+
+
+def rank_suspects(changes, rev='git_rev'):
+    """Ranks the revisions of `detect_changes` by the number of series they made
+    worse, then by their largest relative change."""
+    changes = changes.assign(_worst=changes['change'].abs())
+    suspects = changes.groupby([rev, 'position'], as_index=False).agg(
+        series=('change', 'size'), worst_change=('_worst', 'max'), mean_change=('_worst', 'mean'))
+    return suspects.sort_values(['series', 'worst_change'], ascending=False, ignore_index=True)
+
+
+def changed_series(matrix, changes, keys, limit, rev='git_rev', y='tps'):
+    """Returns the measurements of the `limit` series with the largest changes as a
+    long frame (one row per revision and series) for plotting, with a `series`
+    label and a `changed` flag on the revisions the series changed at."""
+    top = changes.reindex(changes['change'].abs().sort_values(ascending=False).index)
+    top = top.drop_duplicates(keys).head(limit)
+
+    position = pd.Series(np.arange(len(matrix)), index=matrix.index)
+    data = matrix.stack(list(range(matrix.columns.nlevels))).rename(y).reset_index()
+    data = data.merge(top[keys], on=keys)
+    data['position'] = data[rev].map(position)
+    data['series'] = [', '.join(str(k) for k in key) for key in data[keys].itertuples(index=False)]
+    data = data.merge(changes[keys + ['position']].assign(changed=True),
+                      on=keys + ['position'], how='left')
+    data['changed'] = data['changed'].fillna(False).astype(bool)
+    return data
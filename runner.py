@@ -0,0 +1,195 @@
+"""
+Runs a benchmark and aggregates its results while they are printed.
+
+The benchmark is expected to print its log as csv on stdout (a header line
+followed by one record per line, other output is passed through). Records are
+parsed in batches, fed to an incremental aggregator and appended to a
+columnar archive, so there is no csv to write and parse again afterwards.
+"""
+import csv
+import io
+import shlex
+import subprocess
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from plumbum import local
+from plumbum.commands.processes import ProcessExecutionError
+
+# number of records parsed and aggregated at once
+BATCH_ROWS = 10000
+
+# columns that are always parsed as strings, a short revision hash can be all digits
+STR_COLUMNS = ['git_rev', 'benchmark']
+
+
+class ThroughputAggregator:
+    """Incrementally reduces a per-second throughput log to one row per thread.
+
+    Every thread's log is identified by `keys`. The first `head` and the last
+    `tail` records of every thread are dropped (see `throughput.trim_samples`),
+    `operations` of the remaining records are summed and `duration` is the
+    length of the remaining window. The result has the same shape as the
+    per-thread frames the plot scripts aggregate their logs to.
+    """
+
+    def __init__(self, keys, head=0, tail=0, predicate=None):
+        self.keys = keys
+        self.head = head
+        self.tail = tail
+        self.predicate = predicate
+        self.seen = None
+        self.offset = []
+        self.totals = None
+        self.pending = None
+
+    def update(self, batch):
+        "Adds a batch of records, in log order"
+        if self.predicate is not None:
+            batch = batch[self.predicate(batch)]
+        if len(batch) == 0:
+            return
+
+        index = pd.MultiIndex.from_frame(batch[self.keys])
+        if self.head > 0:
+            groups = batch.groupby(self.keys, sort=False)
+            rank = groups.cumcount().to_numpy()
+            if self.seen is not None:
+                rank += self.seen.reindex(index, fill_value=0).to_numpy()
+                self.seen = pd.concat([self.seen, groups.size()]).groupby(level=self.keys).sum()
+            else:
+                self.seen = groups.size()
+            warmup_end = rank == self.head - 1
+            self.offset.append(pd.Series(batch['duration'].to_numpy()[warmup_end],
+                                         index=index[warmup_end]))
+            batch = batch[rank >= self.head]
+
+        if self.tail > 0:
+            # hold back the last `tail` records of every thread until more arrive
+            if self.pending is not None:
+                batch = pd.concat([self.pending, batch], ignore_index=True)
+            held = batch.groupby(self.keys, sort=False).cumcount(ascending=False) < self.tail
+            self.pending = batch[held]
+            batch = batch[~held]
+
+        part = batch.groupby(self.keys).agg({'operations': 'sum', 'duration': 'max'})
+        if self.totals is not None:
+            part = pd.concat([self.totals, part]).groupby(level=self.keys).agg(
+                {'operations': 'sum', 'duration': 'max'})
+        self.totals = part
+
+    def result(self):
+        "Returns one row per thread with the summed `operations` and the `duration` of the kept window"
+        if self.totals is None:
+            threads = pd.DataFrame(columns=self.keys + ['operations', 'duration'])
+        else:
+            threads = self.totals.copy()
+            if len(self.offset) > 0:
+                offset = pd.concat(self.offset)
+                threads['duration'] -= offset.reindex(threads.index, fill_value=0).to_numpy()
+            threads = threads.reset_index()
+        # tells `trim_samples` there are no per-second records left to trim
+        threads.attrs['trimmed'] = True
+        return threads
+
+
+class ColumnArchive:
+    """Appends frames to a compressed, columnar archive.
+
+    The archive is a zip of numpy arrays, one member per column and batch
+    (`<column>/<batch>.npy`), so it can be written while a benchmark runs and
+    single columns can be read back without touching the others.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.batches = 0
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def append(self, df):
+        for column in df.columns:
+            values = df[column].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            buf = io.BytesIO()
+            np.save(buf, values, allow_pickle=False)
+            self.zip.writestr("{}/{:08d}.npy".format(column, self.batches), buf.getvalue())
+        self.batches += 1
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def archive_members(archive):
+    "Returns the members of an open `ColumnArchive` zip, per column in batch order"
+    members = {}
+    for name in archive.namelist():
+        members.setdefault(name.split('/')[0], []).append(name)
+    return members
+
+
+def read_member(archive, name):
+    "Reads one column batch of an open `ColumnArchive` zip"
+    return np.load(io.BytesIO(archive.read(name)))
+
+
+def stream_records(command, header=None, echo=True):
+    """Runs `command` and yields its csv records as frames of up to `BATCH_ROWS` rows.
+
+    If `header` is None the first line with more than one csv field is taken as
+    the header. Lines that do not have as many fields as the header are passed
+    through to stdout if `echo` is set. `STR_COLUMNS` and the columns that
+    were parsed as strings once stay strings in every later batch, so a key
+    has the same type in all batches.
+    """
+    argv = shlex.split(command) if isinstance(command, str) else list(command)
+    proc = local[argv[0]][argv[1:]].popen(stdout=subprocess.PIPE, stderr=None)
+
+    dtype = {column: str for column in STR_COLUMNS}
+
+    def parse(lines):
+        batch = pd.read_csv(io.StringIO(''.join(lines)), names=header, dtype=dtype)
+        dtype.update((column, str) for column in batch.columns if batch[column].dtype == object)
+        return batch
+
+    lines = []
+    for line in io.TextIOWrapper(proc.stdout):
+        fields = next(csv.reader([line]), [])
+        if header is None and len(fields) > 1:
+            header = fields
+        elif header is not None and len(fields) == len(header):
+            lines.append(line)
+            if len(lines) >= BATCH_ROWS:
+                yield parse(lines)
+                lines = []
+        elif echo:
+            print(line, end='')
+    if len(lines) > 0:
+        yield parse(lines)
+
+    retcode = proc.wait()
+    if retcode != 0:
+        raise ProcessExecutionError(argv, retcode, '', '')
+
+
+def run(command, aggregator, archive=None, header=None):
+    "Runs `command`, feeds its records to `aggregator` and appends them to the `archive` path"
+    print("+ Running '%s'" % command)
+    out = ColumnArchive(archive) if archive is not None else None
+    try:
+        for batch in stream_records(command, header):
+            aggregator.update(batch)
+            if out is not None:
+                out.append(batch)
+    finally:
+        if out is not None:
+            out.close()
+    return aggregator.result()
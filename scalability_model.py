@@ -0,0 +1,91 @@
+"""
+Fits scalability models to throughput-vs-cores series.
+
+Universal Scalability Law:  X(N) = lambda * N / (1 + sigma * (N - 1) + kappa * N * (N - 1))
+Amdahl's law:               X(N) = lambda * N / (1 + sigma * (N - 1))
+
+Both are linear in 1/lambda, sigma/lambda and kappa/lambda once written as
+N / X(N), so all series are fitted together with one batched least-squares
+solve instead of a non-linear fit per series.
+"""
+import numpy as np
+import pandas as pd
+
+
+def fit_scalability(df, keys, x='ncores', y='tps'):
+    """Fits USL and Amdahl's law to every series of `y` over `x` in `df`.
+
+    A series is the set of rows sharing `keys`. Returns one row per series with
+    the USL coefficients (`usl_lambda`, `usl_sigma` contention, `usl_kappa`
+    coherency), the Amdahl coefficients (`amdahl_lambda`, `amdahl_sigma`) and
+    `usl_peak`, the core count where the USL curve peaks. A USL fit with a
+    negative coherency coefficient falls back to the Amdahl fit, and a fit
+    with a negative contention coefficient is refitted without contention
+    (pure linear scaling for Amdahl).
+    """
+    data = df.loc[df[y] > 0, keys + [x, y]]
+    groups = data.groupby(keys, sort=True, dropna=False)
+    codes = groups.ngroup().to_numpy()
+    nseries = groups.ngroups
+
+    n = data[x].to_numpy(dtype=np.float64)
+    target = n / data[y].to_numpy(dtype=np.float64)
+    features = np.stack([np.ones_like(n), n - 1, n * (n - 1)], axis=1)
+
+    # normal equations A^T A p = A^T b of every series, summed per group code
+    gram = np.zeros((nseries, 3, 3))
+    rhs = np.zeros((nseries, 3))
+    for i in range(3):
+        rhs[:, i] = np.bincount(codes, features[:, i] * target, minlength=nseries)
+        for j in range(i, 3):
+            gram[:, i, j] = gram[:, j, i] = np.bincount(
+                codes, features[:, i] * features[:, j], minlength=nseries)
+
+    def solve(terms):
+        "Least-squares coefficients of the features `terms` of every series"
+        terms = np.array(terms)
+        coef = np.zeros((nseries, 3))
+        coef[:, terms] = np.einsum('sij,sj->si', np.linalg.pinv(gram[:, terms[:, None], terms]),
+                                   rhs[:, terms])
+        return coef
+
+    # a negative coefficient is refitted without it, down to pure linear scaling
+    linear = solve([0])
+    amdahl = solve([0, 1])
+    amdahl = np.where(amdahl[:, 1:2] >= 0, amdahl, linear)
+    usl = solve([0, 1, 2])
+    coherent = solve([0, 2])
+    coherent = np.where(coherent[:, 2:3] >= 0, coherent, linear)
+    usl = np.where(usl[:, 2:3] < 0, amdahl, np.where(usl[:, 1:2] < 0, coherent, usl))
+
+    fits = groups.size().reset_index()[keys]
+    fits['amdahl_lambda'] = 1 / amdahl[:, 0]
+    fits['amdahl_sigma'] = amdahl[:, 1] / amdahl[:, 0]
+    fits['usl_lambda'] = 1 / usl[:, 0]
+    fits['usl_sigma'] = usl[:, 1] / usl[:, 0]
+    fits['usl_kappa'] = usl[:, 2] / usl[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fits['usl_peak'] = np.sqrt((1 - fits['usl_sigma']) / fits['usl_kappa'])
+    return fits
+
+
+def scalability_curves(fits, keys, ncores, x='ncores', y='tps'):
+    """Evaluates the fitted models of every series at the core counts `ncores`.
+
+    Returns a long frame with the `keys`, `x`, `y` and the `model` name.
+    """
+    n = np.asarray(ncores, dtype=np.float64)
+    curves = []
+    for model in ['USL', 'Amdahl']:
+        prefix = model.lower() + '_'
+        lam = fits[prefix + 'lambda'].to_numpy()[:, None]
+        sigma = fits[prefix + 'sigma'].to_numpy()[:, None]
+        kappa = fits['usl_kappa'].to_numpy()[:, None] if model == 'USL' else 0.0
+        values = lam * n / (1 + sigma * (n - 1) + kappa * n * (n - 1))
+
+        curve = fits[keys].loc[fits.index.repeat(len(n))].reset_index(drop=True)
+        curve[x] = np.tile(n, len(fits))
+        curve[y] = values.ravel()
+        curve['model'] = model
+        curves.append(curve)
+    return pd.concat(curves, ignore_index=True)
@@ -0,0 +1,31 @@
+"""
+Speedup of OS series over a baseline series.
+"""
+import numpy as np
+
+
+def compute_speedup(df, column, baseline, keys, y='tps', std=None):
+    """Divides every series of `y` by the `baseline` series, point by point.
+
+    The series are told apart by `column` (e.g. `os`) and aligned on `keys`
+    (e.g. `ncores`, `benchmark`, ...) with a single merge against the baseline.
+    Repeated measurements of a point are averaged first; their spread, or the
+    `std` column if given, is propagated to `speedup_std` assuming independent
+    errors. Points without a baseline measurement are dropped.
+
+    Returns one row per series and point with `y`, `speedup` and `speedup_std`.
+    """
+    data = df[[column] + keys + [y]].assign(
+        _var=df[std].fillna(0) ** 2 if std is not None else np.nan)
+    points = data.groupby([column] + keys, as_index=False, dropna=False).agg(
+        **{y: (y, 'mean'), '_spread': (y, 'std'), '_var': ('_var', 'mean')})
+    points['_std'] = np.sqrt(points['_var']) if std is not None else points['_spread'].fillna(0)
+
+    base = points.loc[points[column] == baseline, keys + [y, '_std']]
+    ratios = points.loc[points[column] != baseline, [column] + keys + [y, '_std']] \
+        .merge(base, on=keys, suffixes=('', '_base'))
+
+    ratios['speedup'] = ratios[y] / ratios[y + '_base']
+    ratios['speedup_std'] = ratios['speedup'] * np.sqrt(
+        (ratios['_std'] / ratios[y]) ** 2 + (ratios['_std_base'] / ratios[y + '_base']) ** 2)
+    return ratios.drop(columns=['_std', '_std_base', y + '_base'])
@@ -0,0 +1,94 @@
+"""
+Helpers shared by the throughput plot scripts.
+"""
+import numpy as np
+
+# default grouping of a per-second throughput log: one time series per thread
+# of a run (also what `runner.ThroughputAggregator` is given for the vmops logs)
+TRIM_KEYS = ['git_rev', 'benchmark', 'ncores', 'memsize', 'thread_id']
+
+
+def trim_samples(df, keys=TRIM_KEYS, head=0, tail=0, head_pct=0.0, tail_pct=0.0,
+                 duration='duration'):
+    """Drops warm-up and cool-down measurements of every time series in a
+    per-second throughput log.
+
+    A time series is the set of rows sharing `keys`, in log order. The first
+    `head` (or `head_pct` percent) and the last `tail` (or `tail_pct` percent)
+    rows of every series are dropped; the larger of the absolute and the
+    relative bound wins. If `duration` names a column, it is rebased to the end
+    of the dropped warm-up so `operations / duration` stays a rate over the
+    remaining window. Frames that are already trimmed (`df.attrs['trimmed']`,
+    e.g. the per-thread frames from `runner.ThroughputAggregator`) are returned
+    as they are.
+
+    Rows are ranked with a single `groupby().cumcount()` and everything else
+    is numpy on the group codes, there are no per-group python loops.
+    """
+    if len(df) == 0 or df.attrs.get('trimmed', False) or (head == 0 and tail == 0 and head_pct == 0 and tail_pct == 0):
+        return df
+
+    groups = df.groupby(keys, sort=False, dropna=False)
+    codes = groups.ngroup().to_numpy()
+    rank = groups.cumcount().to_numpy()
+    sizes = np.bincount(codes)
+
+    head_n = np.maximum(head, np.floor(sizes * head_pct / 100)).astype(np.int64)
+    tail_n = np.maximum(tail, np.floor(sizes * tail_pct / 100)).astype(np.int64)
+    first = head_n[codes]
+    keep = (rank >= first) & (rank < (sizes - tail_n)[codes])
+
+    trimmed = df[keep]
+    if duration is not None and duration in df.columns:
+        # end of the last dropped warm-up measurement of every series
+        offset = np.zeros(len(sizes), dtype=df[duration].dtype)
+        warmup_end = rank == first - 1
+        offset[codes[warmup_end]] = df[duration].to_numpy()[warmup_end]
+        trimmed = trimmed.assign(
+            **{duration: trimmed[duration].to_numpy() - offset[codes[keep]]})
+    return trimmed
+
+
+
+def thread_fairness(threads, keys, tps='tps', run=None):
+    """Summarises the per-thread throughput `tps` of every group in `keys`.
+
+    `threads` holds one row per thread (see `per_thread_throughput` in
+    vmops_throughput_plot.py). Returns the min/median/max/mean of the
+    per-thread throughput, its coefficient of variation and Jain's fairness
+    index `(sum x)^2 / (n * sum x^2)`, all from a single groupby.
+
+    If `run` names the columns that tell runs apart (e.g. `git_rev`), the
+    threads of every run are summarised on their own and the groups report
+    the number of `runs`, the `threads` per run, the extremes of the
+    per-thread throughput over all runs and the mean of the other statistics,
+    so differences between runs do not count as thread imbalance.
+    """
+    if run:
+        stats = thread_fairness(threads, keys + run, tps)
+        return stats.groupby(keys, as_index=False).agg(
+            runs=('threads', 'count'),
+            threads=('threads', 'max'),
+            tps_min=('tps_min', 'min'),
+            tps_median=('tps_median', 'median'),
+            tps_max=('tps_max', 'max'),
+            tps_mean=('tps_mean', 'mean'),
+            cv=('cv', 'mean'),
+            jain=('jain', 'mean'))
+
+    x = threads[tps].to_numpy(dtype=np.float64)
+    stats = threads.assign(_tps=x, _tps_sq=x * x).groupby(keys, as_index=False).agg(
+        threads=('_tps', 'count'),
+        tps_min=('_tps', 'min'),
+        tps_median=('_tps', 'median'),
+        tps_max=('_tps', 'max'),
+        tps_sum=('_tps', 'sum'),
+        tps_sum_sq=('_tps_sq', 'sum'))
+
+    n = stats['threads']
+    stats['tps_mean'] = stats['tps_sum'] / n
+    # population standard deviation, a single thread is perfectly fair
+    var = (stats['tps_sum_sq'] / n - stats['tps_mean'] ** 2).clip(lower=0)
+    stats['cv'] = np.sqrt(var) / stats['tps_mean']
+    stats['jain'] = stats['tps_sum'] ** 2 / (n * stats['tps_sum_sq'])
+    return stats.drop(columns=['tps_sum', 'tps_sum_sq'])
@@ -24,6 +24,16 @@ from plotnine.themes.elements import (element_line, element_rect,
 from plotnine.themes.theme import theme
 from plotnine.themes.theme_gray import theme_gray
 
+from fetch import fetch, fetch_results, is_url
+from interactive import save_html, throughput_chart
+from machines import join_machines, render_parallel
+from query import scan
+from regression import changed_series, detect_changes, rank_suspects, revision_matrices, revision_order
+from runner import ThroughputAggregator, run
+from scalability_model import fit_scalability, scalability_curves
+from speedup import compute_speedup
+from throughput import TRIM_KEYS, thread_fairness, trim_samples
+
 # this is the width of a column in the latex template
 LATEX_TEMPLATE_COLUMNWIDTH = 84.70798
 
@@ -42,6 +52,12 @@ PLOT_ASPECT_RATIO = 16/6
 # this is the plot height
 PLOT_HEIGHT = PLOT_WIDTH/PLOT_ASPECT_RATIO
 
+# layers with more elements than this are rasterised in the pdf output
+RASTER_THRESHOLD = 5000
+
+# this is the resolution of rasterised layers in the pdf output
+RASTER_DPI = 300
+
 class bcolors:
     OK = '\033[32m'
     WARNING = '\033[33m'
@@ -49,6 +65,36 @@ class bcolors:
     BOLD = '\033[1m'
     RESET = '\033[0m'
 
+# number of per-second measurements dropped at the start of every thread's log
+WARMUP_SECONDS = 1
+
+# number of per-second measurements dropped at the end of every thread's log
+COOLDOWN_SECONDS = 0
+
+# the speedup plots are relative to this os
+SPEEDUP_BASELINE = 'Linux VMA'
+
+# core count the fitted scalability models are extrapolated to
+FIT_MAX_CORES = 512
+
+# a series the scalability models are fitted to
+FIT_KEYS = ['machine', 'os', 'benchmark']
+
+# prefix of an input argument that runs the benchmark instead of reading a csv
+RUN_PREFIX = 'run:'
+
+# columns of the vmops results that are read for the plots
+RESULT_COLUMNS = ['machine', 'git_rev', 'thread_id', 'benchmark', 'ncores', 'memsize', 'duration', 'operations']
+
+# durations in the logs are in milliseconds
+MS_TO_SEC = 0.001
+
+# a series that is checked for regressions across revisions
+REGRESSION_KEYS = ['machine', 'os', 'benchmark', 'memsize', 'ncores']
+
+# number of changed series plotted in the regression report
+REGRESSION_PLOT_SERIES = 16
+
 # What machine, max cores, linux vmops rev
 MACHINES = [
     {
@@ -87,45 +133,192 @@ class theme_my538(theme_gray):
             inplace=True)
 
 
+def per_thread_throughput(df, keys):
+    "Aggregates a raw log to one row per thread of a run, with the thread's throughput in `tps`"
+    # runs of different revisions are kept apart where the log has them
+    keys = keys + [k for k in ['git_rev'] if k in df.columns and k not in keys]
+    threads = df.groupby(keys + ['thread_id'], as_index=False).agg(
+        {'operations': 'sum', 'duration': 'max'})
+    threads['tps'] = (threads['operations'] /
+                      (threads['duration'] * MS_TO_SEC)).fillna(0.0)
+    return threads
+
+
+def plot_fairness(filename, machine, benchmark_name, threads):
+    "Plots the spread of the per-thread throughput and writes the fairness table"
+    # fairness is a property of a run, the threads of different runs are not compared
+    stats = thread_fairness(threads, ['os', 'benchmark', 'ncores'],
+                            run=[k for k in ['git_rev', 'memsize'] if k in threads.columns])
+    stats['ncores'] = stats['ncores'].astype('int64', copy=False)
+    print(stats)
+
+    print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                 ("{}-{}-fairness.csv|png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
+    stats.to_csv("{}-{}-fairness.csv".format(filename, benchmark_name), index=False)
+
+    xskip = int(machine['cores']/8)
+    p = ggplot(data=stats, mapping=aes(x='ncores', y='tps_median', ymin='tps_min', ymax='tps_max', color='os', shape='os')) + \
+        theme_my538() + \
+        labs(y="Thread Throughput [Mops/s]") + \
+        theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
+        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Cores') + \
+        scale_y_log10(labels=lambda lst: ["{:,.2f}".format(y / 1_000_000) for y in lst]) + \
+        scale_color_manual(["#E78AC3", "#66C2A5", "#FC8D62", "#8DA0CB", "#A6D854", "#FFD92F", "#E5C494", "#B3B3B3"]) + \
+        geom_pointrange(position=position_dodge(width=xskip/2), size=0.3) + \
+        guides(color=guide_legend(nrow=1))
+
+    p.save("{}-{}-fairness.png".format(filename, benchmark_name),
+           dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-fairness.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+
+def plot_speedup(filename, machine, benchmark_name, benchmark):
+    "Plots the throughput of every os relative to `SPEEDUP_BASELINE` and writes the ratio table"
+    ratios = compute_speedup(benchmark, 'os', SPEEDUP_BASELINE, ['ncores', 'benchmark', 'memsize'],
+                             std='tps_std' if 'tps_std' in benchmark else None)
+    if len(ratios) == 0:
+        print("no %s data to compare against" % SPEEDUP_BASELINE)
+        return
+    print(ratios)
+
+    print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                 ("{}-{}-speedup.csv|png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
+    ratios.to_csv("{}-{}-speedup.csv".format(filename, benchmark_name), index=False)
+
+    xskip = int(machine['cores']/8)
+    p = ggplot(data=ratios, mapping=aes(x='ncores', y='speedup', color='os', shape='os', group='os')) + \
+        theme_my538() + \
+        labs(y="Speedup vs. {}".format(SPEEDUP_BASELINE)) + \
+        theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
+        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Cores') + \
+        scale_color_manual(["#66C2A5", "#FC8D62", "#8DA0CB", "#A6D854", "#FFD92F", "#E5C494", "#B3B3B3"]) + \
+        geom_hline(yintercept=1, color='#3C3C3C', linetype='dashed', size=0.3) + \
+        geom_point() + \
+        geom_line() + \
+        geom_errorbar(aes(ymin="speedup-speedup_std", ymax="speedup+speedup_std"), color='black') + \
+        guides(color=guide_legend(nrow=1))
+
+    p.save("{}-{}-speedup.png".format(filename, benchmark_name),
+           dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-speedup.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+
+def scalability_plot(benchmark, xmax, fits=None):
+    "Builds the throughput vs. cores plot of `benchmark`, with the curves of the scalability models in `fits`"
+    xskip = int((FIT_MAX_CORES if fits is not None else xmax)/8)
+    raster = len(benchmark) > RASTER_THRESHOLD
+
+    p = ggplot(data=benchmark, mapping=aes(x='ncores', y='tps', ymin=0, xmax=12, color='os', shape='os', group='os')) + \
+        theme_my538() + \
+        labs(y="Throughput [Mops/s]") + \
+        theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
+        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Cores') + \
+        scale_y_log10(labels=lambda lst: ["{:,.2f}".format(y / 1_000_000) for y in lst]) + \
+        scale_color_manual(["#E78AC3", "#66C2A5", "#FC8D62", "#8DA0CB", "#A6D854", "#FFD92F", "#E5C494", "#B3B3B3"]) + \
+        scale_shape_manual(values=[
+            's',
+            'o',
+            '^',
+            'D',
+            'v',
+            '*',
+        ]) + \
+        geom_point(raster=raster) + \
+        geom_line(raster=raster) + \
+        geom_errorbar(aes(ymin="tps-tps_std", ymax="tps+tps_std"), color='black', raster=raster) + \
+        guides(color=guide_legend(nrow=1))
+
+    if fits is not None:
+        curves = scalability_curves(fits, FIT_KEYS, range(1, FIT_MAX_CORES + 1))
+        curves['fit'] = curves['os'] + curves['model']
+        p = p + geom_line(data=curves, mapping=aes(linetype='model', group='fit'), size=0.3)
+    return p
+
+
+def plot_machine(filename, machine, benchmark_name, benchmark, threads, fairness=False,
+                 interactive=False, fit=False, speedup=False, throughput=True):
+    "Writes the plots of one machine's aggregated results"
+    if fairness and len(threads) > 0:
+        plot_fairness(filename, machine, benchmark_name, threads)
+    if speedup:
+        plot_speedup(filename, machine, benchmark_name, benchmark)
+    if interactive:
+        save_html(throughput_chart(benchmark, 'ncores', 'tps', 'os', "Throughput [ops/s]",
+                                   std='tps_std' if 'tps_std' in benchmark else None, log_y=True),
+                  "{}-{}-throughput.html".format(filename, benchmark_name))
+    fits = None
+    if fit:
+        fits = fit_scalability(benchmark, FIT_KEYS)
+        print(fits)
+        fits.to_csv("{}-{}-scalability-fit.csv".format(filename, benchmark_name), index=False)
+    if not throughput:
+        return
+
+    p = scalability_plot(benchmark, machine['cores'], fits)
+
+    print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                 ("{}-{}-throughput.png".format(filename, benchmark_name))) + bcolors.RESET)
+
+    p.save("{}-{}-throughput.png".format(filename, benchmark_name),
+           dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+    p.save("{}-{}-throughput.pdf".format(filename, benchmark_name),
+           dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+
 def plot_scalability(filename, machine, benchmark_name, df_linux,
                      df_bespin, df_barrelfish, df_barrelfish_vailla,
-                     df_sv6):
+                     df_sv6, fairness=False, interactive=False, fit=False, speedup=False,
+                     facet=False):
     "Plots a throughput graph for various threads showing the throughput over time"
+    # `machine` is one entry of `MACHINES` or a list of them. Every machine gets
+    # its own plots, named after the machine if a list is given, or with
+    # `facet` the throughput of all machines is plotted side by side.
+    machines = machine if isinstance(machine, list) else [machine]
 
     print("\n" + bcolors.BOLD + ("+ Plotting '%s' on '%s'" %
-                                 (benchmark_name, machine['name'])) + bcolors.RESET)
+                                 (benchmark_name, ', '.join(m['name'] for m in machines))) + bcolors.RESET)
 
     dataframes = []
+    thread_frames = []
 
     if df_bespin is not None:
         df_bespin['os'] = "NrOS vMem"
+        df_bespin = join_machines(df_bespin, machines)
         for name in df_bespin.benchmark.unique():
-            MS_TO_SEC = 0.001
             # Bespin data format is different, it has a log entry for every second
-            # We drop the first measurement and take the mean of the rest
+            # We drop the warm-up/cool-down measurements and take the mean of the rest
             benchmark_bespin = df_bespin.loc[(df_bespin['benchmark'] == name) & (
-                df_bespin['duration'] != 0) & (df_bespin['ncores'] <= machine['cores'])]
+                df_bespin['duration'] != 0)]
+            benchmark_bespin = trim_samples(
+                benchmark_bespin, ['machine'] + TRIM_KEYS, head=WARMUP_SECONDS, tail=COOLDOWN_SECONDS)
+
+            threads = per_thread_throughput(
+                benchmark_bespin, ['machine', 'ncores', 'benchmark', 'memsize', 'os', 'git_rev'])
+            thread_frames.append(threads)
 
             # aggregate different runs based on `git_rev`:
-            benchmark_bespin = benchmark_bespin.groupby(['ncores', 'benchmark', 'memsize', 'os', 'git_rev'], as_index=False).agg(
+            benchmark_bespin = threads.groupby(['machine', 'ncores', 'benchmark', 'memsize', 'os', 'git_rev'], as_index=False).agg(
                 {'operations': 'sum', 'thread_id': 'count', 'duration': 'max'})
             benchmark_bespin['tps'] = (
                 benchmark_bespin['operations'] / (benchmark_bespin['duration'] * MS_TO_SEC)).fillna(0.0).astype(int)
             benchmark_bespin['tps_std'] = benchmark_bespin['tps']
             benchmark_bespin = benchmark_bespin.groupby(
-                ['ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg({'tps': 'mean', 'tps_std': 'std'})
+                ['machine', 'ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg({'tps': 'mean', 'tps_std': 'std'})
             dataframes.append(benchmark_bespin)
 
     if df_linux is not None:
         df_linux['os'] = "Linux VMA"
-        df_linux['benchmark'] = df_linux.apply(lambda row: "{}".format(
-            row.benchmark.split("-")[0]), axis=1)
+        df_linux['benchmark'] = df_linux['benchmark'].str.split("-").str[0]
+        df_linux = join_machines(df_linux, machines)
         for name in df_linux.benchmark.unique():
-            benchmark = df_linux.loc[(df_linux['benchmark'] ==
-                                      name) & (df_linux['ncores'] <= machine['cores'])]
-            benchmark = benchmark.groupby(['ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg(
+            benchmark = df_linux.loc[df_linux['benchmark'] == name]
+            threads = per_thread_throughput(
+                benchmark, ['machine', 'ncores', 'benchmark', 'memsize', 'os'])
+            thread_frames.append(threads)
+            benchmark = threads.groupby(['machine', 'ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg(
                 {'operations': 'sum', 'thread_id': 'count', 'duration': 'max'})
-            MS_TO_SEC = 0.001
             benchmark['tps'] = (benchmark['operations'] /
                                 (benchmark['duration'] * MS_TO_SEC)).fillna(0.0).astype(int)
             #print(benchmark)
@@ -133,14 +326,16 @@ def plot_scalability(filename, machine, benchmark_name, df_linux,
 
     if df_barrelfish is not None:
         df_barrelfish['os'] = "Barrelfish Opt"
-        df_barrelfish['benchmark'] = df_barrelfish.apply(lambda row: "{}".format(
-            row.benchmark.split("-")[0]), axis=1)
+        df_barrelfish['benchmark'] = df_barrelfish['benchmark'].str.split("-").str[0]
+        df_barrelfish = join_machines(df_barrelfish, machines)
 
         for name in df_barrelfish.benchmark.unique():
             benchmark_barrelfish = df_barrelfish.loc[df_barrelfish['benchmark'] == name]
-            benchmark_barrelfish = benchmark_barrelfish.groupby(['ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg(
+            threads = per_thread_throughput(
+                benchmark_barrelfish, ['machine', 'ncores', 'benchmark', 'memsize', 'os'])
+            thread_frames.append(threads)
+            benchmark_barrelfish = threads.groupby(['machine', 'ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg(
                 {'operations': 'sum', 'thread_id': 'count', 'duration': 'max'})
-            MS_TO_SEC = 0.001
             benchmark_barrelfish['tps'] = (benchmark_barrelfish['operations'] /
                                            (benchmark_barrelfish['duration'] * MS_TO_SEC)).fillna(0.0).astype(int)
             # print(benchmark_barrelfish)
@@ -152,19 +347,21 @@ def plot_scalability(filename, machine, benchmark_name, df_linux,
         df_sv6 = df_sv6.assign(tps=df_sv6['tps'] * 1000000)
         df_sv6['os'] = 'sv6'
         df_sv6['benchmark'] = 'maponly'
-        dataframes.append(df_sv6)
+        dataframes.append(join_machines(df_sv6, machines))
 
     if df_barrelfish_vailla is not None:
         df_barrelfish_vailla['os'] = "Barrelfish Vanilla"
-        df_barrelfish_vailla['benchmark'] = df_barrelfish_vailla.apply(lambda row: "{}".format(
-            row.benchmark.split("-")[0]), axis=1)
+        df_barrelfish_vailla['benchmark'] = df_barrelfish_vailla['benchmark'].str.split("-").str[0]
+        df_barrelfish_vailla = join_machines(df_barrelfish_vailla, machines)
 
         for name in df_barrelfish_vailla.benchmark.unique():
             benchmark_barrelfish_vanilla = df_barrelfish_vailla.loc[
                 df_barrelfish_vailla['benchmark'] == name]
-            benchmark_barrelfish_vanilla = benchmark_barrelfish_vanilla.groupby(['ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg(
+            threads = per_thread_throughput(
+                benchmark_barrelfish_vanilla, ['machine', 'ncores', 'benchmark', 'memsize', 'os'])
+            thread_frames.append(threads)
+            benchmark_barrelfish_vanilla = threads.groupby(['machine', 'ncores', 'benchmark', 'memsize', 'os'], as_index=False).agg(
                 {'operations': 'sum', 'thread_id': 'count', 'duration': 'max'})
-            MS_TO_SEC = 0.001
             benchmark_barrelfish_vanilla['tps'] = (benchmark_barrelfish_vanilla['operations'] /
                                                    (benchmark_barrelfish_vanilla['duration'] * MS_TO_SEC)).fillna(0.0).astype(int)
             # print(benchmark_barrelfish)
@@ -172,42 +369,110 @@ def plot_scalability(filename, machine, benchmark_name, df_linux,
 
     benchmark = pd.concat(dataframes)
     benchmark['ncores'] = benchmark['ncores'].astype('int64', copy=False)
-    xskip = int(machine['cores']/8)
-
-    p = ggplot(data=benchmark, mapping=aes(x='ncores', y='tps', ymin=0, xmax=12, color='os', shape='os', group='os')) + \
+    threads = pd.concat(thread_frames) if len(thread_frames) > 0 else pd.DataFrame(columns=['machine'])
+
+    jobs = []
+    for m in machines:
+        data = benchmark[benchmark['machine'] == m['name']]
+        if len(data) == 0:
+            continue
+        jobs.append((filename if isinstance(machine, dict) else m['name'],
+                     m, benchmark_name, data, threads[threads['machine'] == m['name']],
+                     fairness, interactive, fit, speedup, not facet))
+    render_parallel(plot_machine, jobs)
+
+    if facet:
+        fits = fit_scalability(benchmark, FIT_KEYS) if fit else None
+        p = scalability_plot(benchmark, max(m['cores'] for m in machines), fits) + \
+            facet_wrap('~machine', scales='free_x') + \
+            theme(legend_position='top')
+
+        print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
+                                     ("{}-{}-throughput.png|pdf".format(filename, benchmark_name))) + bcolors.RESET)
+
+        p.save("{}-{}-throughput.png".format(filename, benchmark_name),
+               dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+        p.save("{}-{}-throughput.pdf".format(filename, benchmark_name),
+               dpi=RASTER_DPI, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
+
+def regression_report(filename, machine, df_linux, df_bespin, repo=None):
+    "Finds the revisions that made the throughput worse and plots the affected series"
+    machines = machine if isinstance(machine, list) else [machine]
+    print("\n" + bcolors.BOLD + ("+ Checking revisions on '%s'" %
+                                 ', '.join(m['name'] for m in machines)) + bcolors.RESET)
+
+    frames = {}
+    if df_bespin is not None:
+        df_bespin = join_machines(df_bespin.assign(os="NrOS vMem"), machines)
+        frames["NrOS vMem"] = trim_samples(df_bespin[df_bespin['duration'] != 0], ['machine'] + TRIM_KEYS,
+                                           head=WARMUP_SECONDS, tail=COOLDOWN_SECONDS)
+    if df_linux is not None:
+        frames["Linux VMA"] = join_machines(df_linux.assign(
+            os="Linux VMA", benchmark=df_linux['benchmark'].str.split("-").str[0]), machines)
+
+    # every os has its own revisions, in the order of its log unless a repository is given
+    orders = {name: revision_order(frame['git_rev'], repo) for name, frame in frames.items()}
+
+    # one throughput per series and revision, summed over the threads of a run
+    threads = per_thread_throughput(pd.concat(frames.values()), REGRESSION_KEYS + ['git_rev'])
+    points = threads.groupby(REGRESSION_KEYS + ['git_rev'], as_index=False).agg(
+        {'operations': 'sum', 'duration': 'max'})
+    points['tps'] = (points['operations'] / (points['duration'] * MS_TO_SEC)).fillna(0.0)
+
+    matrices = revision_matrices(points, REGRESSION_KEYS, orders)
+    if len(matrices) == 0:
+        print(bcolors.WARNING + "+ No revisions to check" + bcolors.RESET)
+        return
+    changes = pd.concat([detect_changes(matrix) for matrix in matrices.values()], ignore_index=True)
+    suspects = rank_suspects(changes)
+    changes.to_csv("{}-regressions.csv".format(filename), index=False)
+    suspects.to_csv("{}-regression-suspects.csv".format(filename), index=False)
+    print(suspects)
+
+    if len(changes) == 0:
+        print(bcolors.OK + ("+ No regressions in %d revisions" %
+                            sum(len(matrix) for matrix in matrices.values())) + bcolors.RESET)
+        return
+
+    data = pd.concat([changed_series(matrix, changes, REGRESSION_KEYS, REGRESSION_PLOT_SERIES)
+                      for matrix in matrices.values()], ignore_index=True)
+    nseries = data['series'].nunique()
+    raster = len(data) > RASTER_THRESHOLD
+    p = ggplot(data=data, mapping=aes(x='position', y='tps')) + \
         theme_my538() + \
-        labs(y="Throughput [Mops/s]") + \
-        theme(legend_position=(0.50, 0.95), legend_title=element_blank(), legend_direction='horizontal') + \
-        scale_x_continuous(breaks=[1] + list(range(xskip, 513, xskip)), name='# Cores') + \
-        scale_y_log10(labels=lambda lst: ["{:,.2f}".format(y / 1_000_000) for y in lst]) + \
-        scale_color_manual(["#E78AC3", "#66C2A5", "#FC8D62", "#8DA0CB", "#A6D854", "#FFD92F", "#E5C494", "#B3B3B3"]) + \
-        scale_shape_manual(values=[
-            's',
-            'o',
-            '^',
-            'D',
-            'v',
-            '*',
-        ]) + \
-        geom_point() + \
-        geom_line() + \
-        geom_errorbar(aes(ymin="tps-tps_std", ymax="tps+tps_std"), color='black') + \
-        guides(color=guide_legend(nrow=1))
-
+        labs(x="Revision", y="Throughput [Mops/s]") + \
+        scale_y_continuous(labels=lambda lst: ["{:,.2f}".format(x / 1_000_000) for x in lst]) + \
+        geom_line(color='#66C2A5', raster=raster) + \
+        geom_vline(data=data[data['changed']], mapping=aes(xintercept='position'),
+                   color='#FC8D62', linetype='dashed', size=0.3) + \
+        facet_wrap('~series', scales='free_y', ncol=4)
+
+    height = PLOT_HEIGHT * np.ceil(nseries / 4)
     print("\n" + bcolors.BOLD + ("+ Saving to '%s'" %
-                                 ("{}-{}-throughput.png".format(filename, benchmark_name))) + bcolors.RESET)
-
-    p.save("{}-{}-throughput.png".format(filename, benchmark_name),
-           dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
-    p.save("{}-{}-throughput.pdf".format(filename, benchmark_name),
-           dpi=300, width=PLOT_WIDTH, height=PLOT_HEIGHT, units=PLOT_SIZE_UNIT)
-
-def parse_results(path):
+                                 ("{}-regressions.png|pdf".format(filename))) + bcolors.RESET)
+    p.save("{}-regressions.png".format(filename),
+           dpi=300, width=2*PLOT_WIDTH, height=height, units=PLOT_SIZE_UNIT)
+    p.save("{}-regressions.pdf".format(filename),
+           dpi=RASTER_DPI, width=2*PLOT_WIDTH, height=height, units=PLOT_SIZE_UNIT)
+
+def select_results(frame, machines=MACHINES):
+    "Pushes the core counts and columns that are plotted into the reader of a results file"
+    return frame.filter('ncores', '<=', max(m['cores'] for m in machines)).select(RESULT_COLUMNS)
+
+def parse_results(path, query=select_results):
+    "Reads a results csv or archive, with the filters and columns of `query(frame)` pushed into the reader"
+    if is_url(path):
+        path = fetch(path)
     if os.path.exists(path):
-        return pd.read_csv(path)
+        return query(scan(path)).collect()
     else:
         return None
 
+def run_results(command, archive, head=0, tail=0, predicate=None):
+    "Runs a benchmark and aggregates its log to one row per thread while it runs"
+    aggregator = ThroughputAggregator(TRIM_KEYS, head=head, tail=tail, predicate=predicate)
+    return run(command, aggregator, archive)
+
 if __name__ == '__main__':
     warnings.filterwarnings('ignore')
     pd.set_option('display.max_rows', 500)
@@ -219,11 +484,60 @@ if __name__ == '__main__':
     print('VMOPS Throughput Plots')
     print('================================================================')
 
+    # --regressions[=<git repo>] only writes a report of the revisions that made the
+    # throughput worse, ordered by commit time in <git repo> or else as they appear in the logs
+    regressions = next((arg for arg in sys.argv if arg.startswith('--regressions')), None)
+    repo = None
+    if regressions is not None:
+        sys.argv.remove(regressions)
+        repo = regressions.partition('=')[2] or None
+
+    # --facet plots all machines side by side instead of one plot per machine
+    facet = '--facet' in sys.argv
+    if facet:
+        sys.argv.remove('--facet')
+
+    # --interactive also writes the plots as html
+    interactive = '--interactive' in sys.argv
+    if interactive:
+        sys.argv.remove('--interactive')
+
+    # --speedup also plots the throughput relative to Linux
+    speedup = '--speedup' in sys.argv
+    if speedup:
+        sys.argv.remove('--speedup')
+
+    # --fit also fits and plots USL/Amdahl scalability models
+    fit = '--fit' in sys.argv
+    if fit:
+        sys.argv.remove('--fit')
+
+    # --fairness also plots the per-thread throughput spread
+    fairness = '--fairness' in sys.argv
+    if fairness:
+        sys.argv.remove('--fairness')
+
+    # results given as http(s) urls are downloaded (concurrently) into a local cache
+    sys.argv[1:] = fetch_results(sys.argv[1:])
+
     if len(sys.argv) >= 3:
         print(
-            "Usage: <linux vmops csv> <bespin vmops csv> [<barrelfish vmops csv>] [<sv6 vmops csv>].")
-        df_linux = parse_results(sys.argv[1])
-        df_bespin = parse_results(sys.argv[2])
+            "Usage: <linux vmops csv|run:cmd> <bespin vmops csv|run:cmd> [<barrelfish vmops csv>] [<sv6 vmops csv>] [--fairness] [--fit] [--speedup] [--interactive] [--facet] [--regressions[=<git repo>]].")
+        machine=MACHINES[0]
+
+        # `run:<command>` runs the benchmark and aggregates its output as it arrives
+        if sys.argv[1].startswith(RUN_PREFIX):
+            df_linux = run_results(sys.argv[1][len(RUN_PREFIX):],
+                                   "{}-linux-vmops.npz".format(machine['name']))
+        else:
+            df_linux = parse_results(sys.argv[1])
+        if sys.argv[2].startswith(RUN_PREFIX):
+            df_bespin = run_results(sys.argv[2][len(RUN_PREFIX):],
+                                    "{}-bespin-vmops.npz".format(machine['name']),
+                                    head=WARMUP_SECONDS, tail=COOLDOWN_SECONDS,
+                                    predicate=lambda df: df['duration'] != 0)
+        else:
+            df_bespin = parse_results(sys.argv[2])
 
         # If passes, then 3rd argument is for barrelfish.
         if len(sys.argv) > 3:
@@ -233,10 +547,16 @@ if __name__ == '__main__':
         
         # If passes, then 4th argument is for sv6.
         if len(sys.argv) > 4:
-            df_sv6 = parse_results(sys.argv[4])
+            # sv6 results have their own format
+            df_sv6 = parse_results(sys.argv[4], query=lambda frame: frame)
         else:
             df_sv6 = None
         filename, file_extension = os.path.splitext(sys.argv[1])
-        machine=MACHINES[0]
-        plot_scalability(machine['name'], machine, "maponly", df_linux,
-                     df_bespin, df_barrelfish, None, df_sv6)
\ No newline at end of file
+        if regressions is not None:
+            regression_report("vmops", MACHINES, df_linux, df_bespin, repo=repo)
+            exit(0)
+
+        # results are split by their `machine` column, untagged ones are from MACHINES[0]
+        plot_scalability("vmops", MACHINES, "maponly", df_linux,
+                     df_bespin, df_barrelfish, None, df_sv6, fairness=fairness,
+                         interactive=interactive, fit=fit, speedup=speedup, facet=facet)
\ No newline at end of file